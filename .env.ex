@@ -3,4 +3,5 @@ MSQL_USER= "smith"
 MSQL_PASSWORD= "abc123"
 MSQL_DB= "comdb"
 NUM_PICS=6
-DEBUG = 1
\ No newline at end of file
+DEBUG = 1
+CACHE_LOCATION=".cache"
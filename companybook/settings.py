@@ -161,6 +161,69 @@ STATICFILES_DIRS = [
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
+# Image size limits are enforced while the upload streams in
+FILE_UPLOAD_HANDLERS = [
+    "core.uploadhandler.SizeLimitUploadHandler",
+    "django.core.files.uploadhandler.MemoryFileUploadHandler",
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
+
+# Caches. "search" holds the id lists of SubscriberSearchView pages and
+# "pages" the rendered public pages for anonymous readers, both bounded by
+# MAX_ENTRIES and expired after TIMEOUT seconds (core/cache.py). Each alias
+# keeps a small in-process LRU in front of a shared tier
+# (core/cache_backends.py): a FileBasedCache under CACHE_LOCATION that
+# every worker reads, so a write in one invalidates the others.
+CACHE_LOCATION = os.environ.get("CACHE_LOCATION", ".cache")
+
+
+def two_tier_cache(name, timeout, max_entries, local_max_entries):
+    shared = {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(BASE_DIR, CACHE_LOCATION, name),
+        "OPTIONS": {"MAX_ENTRIES": max_entries},
+    }
+    return {
+        "BACKEND": "core.cache_backends.TwoTierCache",
+        "LOCATION": name,
+        "TIMEOUT": timeout,
+        "OPTIONS": {
+            "SHARED": shared,
+            "MAX_ENTRIES": local_max_entries,
+            "LOCAL_TIMEOUT": 30,
+            "SYNC_INTERVAL": 1,
+        },
+    }
+
+
+CACHES = {
+    "default": two_tier_cache("default", 5 * 60, 1000, 1000),
+    "search": two_tier_cache("search", 10 * 60, 5000, 500),
+    "pages": two_tier_cache("pages", 60 * 60, 2000, 200),
+}
+
+# Full-text backend for the search view (core/search/backends.py). None picks
+# MySQL FULLTEXT, Postgres tsvector or SQLite FTS5 from the database vendor.
+SEARCH_BACKEND = None
+
+# Company name n-gram index (core/search/ngram.py). The snapshot is written
+# by `manage.py build_search_index` and loaded at startup; after MAX_AGE
+# seconds each process rebuilds it to pick up writes from other workers.
+SEARCH_INDEX_PATH = os.path.join(BASE_DIR, "search_index.pickle")
+SEARCH_INDEX_MAX_AGE = 5 * 60
+
+# Images already done by `manage.py reencode_media`, to resume a run
+REENCODE_CHECKPOINT_PATH = os.path.join(BASE_DIR, "reencode_media.checkpoint")
+
+# JSON report written by `manage.py audit_directory`
+AUDIT_REPORT_PATH = os.path.join(BASE_DIR, "audit_directory.json")
+
+# Threads rendering image variations after an upload is committed
+# (core/jobs.py). 0 renders them synchronously in the on_commit callback.
+IMAGE_JOBS_WORKERS = int(
+    os.environ.get("IMAGE_JOBS_WORKERS", min(4, os.cpu_count() or 1))
+)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
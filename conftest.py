@@ -0,0 +1,17 @@
+import copy
+from django.conf import settings
+
+
+def pytest_configure(config):
+    """
+    Keep the shared tier of every cache in memory: the test run is a
+    single process and must not read or write CACHE_LOCATION. Set before
+    the test modules are imported, some build overrides from CACHES.
+    """
+    caches = copy.deepcopy(settings.CACHES)
+    for alias, cache in caches.items():
+        shared = cache.get("OPTIONS", {}).get("SHARED")
+        if shared is not None:
+            shared["BACKEND"] = "django.core.cache.backends.locmem.LocMemCache"
+            shared["LOCATION"] = alias
+    settings.CACHES = caches
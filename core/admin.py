@@ -1,8 +1,10 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
 from .models import Subscriber, Category, Company
-from .forms import SubscriberForm
+from .forms import CategoryActionForm, SubscriberForm
+from .cache import in_group
+from .export import export_response
 
 
 class BaseAdmin(admin.ModelAdmin):
@@ -12,6 +14,53 @@ class BaseAdmin(admin.ModelAdmin):
         super().save_model(request, obj, form, change)
 
 
+class DirectoryAdmin(BaseAdmin):
+    """
+    Bulk actions run as one UPDATE through ``DirectoryQuerySet.update``
+    instead of a save() per selected row.
+    """
+
+    action_form = CategoryActionForm
+    actions = ["activate", "deactivate", "recategorize"]
+
+    def companies(self, queryset):
+        """The companies of the selected rows."""
+        return queryset
+
+    def updated(self, request, count):
+        self.message_user(request, f"{count} registro(s) atualizado(s).")
+
+    @admin.action(description="Ativar selecionados")
+    def activate(self, request, queryset):
+        self.updated(request, queryset.update(active=True))
+
+    @admin.action(description="Desativar selecionados")
+    def deactivate(self, request, queryset):
+        self.updated(request, queryset.update(active=False))
+
+    @admin.action(description="Alterar categorias dos selecionados")
+    def recategorize(self, request, queryset):
+        form = CategoryActionForm(request.POST)
+        # The action choices are filled by the changelist, not needed here
+        form.fields.pop("action")
+        if not form.is_valid():
+            self.message_user(request, "Categoria inválida.", messages.ERROR)
+            return
+
+        values = {
+            key: form.cleaned_data[key]
+            for key in ("categoria1", "categoria2")
+            if form.cleaned_data[key] is not None
+        }
+        if not values:
+            self.message_user(
+                request, "Escolha ao menos uma categoria.", messages.ERROR
+            )
+            return
+        companies = self.companies(queryset)
+        self.updated(request, companies.update(**values))
+
+
 admin.site.unregister(User)
 
 
@@ -40,25 +89,47 @@ class GPUserAdmin(UserAdmin):
 
 
 @admin.register(Subscriber)
-class SubscriberAdmin(BaseAdmin):
+class SubscriberAdmin(DirectoryAdmin):
     search_fields = ["company__name"]
     exclude = ("user",)
     list_display = ("company", "in_charge", "active", "user")
+    list_select_related = ("company", "user")
+    autocomplete_fields = ("company",)
     form = SubscriberForm
+    actions = DirectoryAdmin.actions + ["export_csv", "export_jsonl"]
+
+    def get_form(self, request, obj=None, **kwargs):
+        form = super().get_form(request, obj, **kwargs)
+        upload_errors = getattr(request, "upload_errors", None)
+        if upload_errors:
+            form = type(
+                form.__name__, (form,), {"upload_errors": upload_errors}
+            )
+        return form
+
+    def companies(self, queryset):
+        return Company.objects.filter(subscriber__in=queryset)
+
+    @admin.action(description="Exportar selecionados (CSV)")
+    def export_csv(self, request, queryset):
+        return export_response(queryset, "csv")
+
+    @admin.action(description="Exportar selecionados (JSONL)")
+    def export_jsonl(self, request, queryset):
+        return export_response(queryset, "jsonl")
 
 
 @admin.register(Company)
-class CompanyAdmin(BaseAdmin):
+class CompanyAdmin(DirectoryAdmin):
     search_fields = ["name", "razao"]
     exclude = ("active", "user")
     list_display = ("razao", "document", "uf", "tel1", "user")
+    list_select_related = ("user",)
+    autocomplete_fields = ("categoria1", "categoria2")
 
     def get_queryset(self, request):
         qs = super(CompanyAdmin, self).get_queryset(request)
-        if (
-            request.user.is_superuser
-            or request.user.groups.filter(name="jedi").exists()
-        ):
+        if request.user.is_superuser or in_group(request.user, "jedi"):
             return qs
 
         return qs.filter(user=request.user)
@@ -66,5 +137,7 @@ class CompanyAdmin(BaseAdmin):
 
 @admin.register(Category)
 class CategoryAdmin(BaseAdmin):
+    search_fields = ["name"]
     exclude = ("active", "user")
     list_display = ("name", "user", "createdAt")
+    list_select_related = ("user",)
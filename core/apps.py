@@ -1,6 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self):
+        from .search.backends import install_search_backend, uses_ngram_index
+        from .search.ngram import load_snapshot
+
+        post_migrate.connect(install_search_backend, sender=self)
+        if uses_ngram_index():
+            load_snapshot()
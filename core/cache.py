@@ -0,0 +1,179 @@
+import hashlib
+import json
+import uuid
+from functools import partial
+from django.core.cache import DEFAULT_CACHE_ALIAS, caches
+from django.db import transaction
+
+SEARCH_CACHE = "search"
+SEARCH_GENERATION_KEY = "search:generation"
+CATEGORY_VERSION_KEY = "categories:version"
+GROUPS_VERSION_KEY = "groups:version"
+
+# Process-local copy of the category options, reloaded when the version
+# in the shared tier of the default cache changes
+_categories = (None, [])
+
+
+def bump_twice(bump, *args):
+    """
+    Call ``bump`` now and again on commit, so a reader on another
+    connection can't cache the pre-write rows under the new token
+    between the write and the commit.
+    """
+    bump(*args)
+    if not transaction.get_autocommit():
+        transaction.on_commit(partial(bump, *args))
+
+
+def shared_cache(alias):
+    """
+    The tier of ``alias`` every worker reads. Generation and version keys
+    skip the TwoTierCache local copy, an invalidation must reach the
+    other workers at once.
+    """
+    cache = caches[alias]
+    return getattr(cache, "shared", cache)
+
+
+def search_generation():
+    cache = shared_cache(SEARCH_CACHE)
+    generation = cache.get(SEARCH_GENERATION_KEY)
+    if generation is None:
+        cache.add(SEARCH_GENERATION_KEY, uuid.uuid4().hex, None)
+        generation = cache.get(SEARCH_GENERATION_KEY)
+    return generation
+
+
+def search_cache_key(*parts):
+    digest = hashlib.sha1(json.dumps(parts).encode()).hexdigest()
+    return f"search:{search_generation()}:{digest}"
+
+
+def get_search_page(key):
+    return caches[SEARCH_CACHE].get(key)
+
+
+def set_search_page(key, ids, cursors):
+    # Keys carry the generation, so a fill never replaces a stale value:
+    # add() spares the two-tier caches a version stamp bump
+    caches[SEARCH_CACHE].add(key, (ids, cursors))
+
+
+def bump_search_generation():
+    # Random tokens rather than a counter, so a restarted or cleared cache
+    # can never reuse the key of an older result
+    shared_cache(SEARCH_CACHE).set(
+        SEARCH_GENERATION_KEY, uuid.uuid4().hex, None
+    )
+
+
+def invalidate_search():
+    """Orphan every cached search page."""
+    bump_twice(bump_search_generation)
+
+
+def categories_version():
+    cache = shared_cache(DEFAULT_CACHE_ALIAS)
+    version = cache.get(CATEGORY_VERSION_KEY)
+    if version is None:
+        cache.add(CATEGORY_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(CATEGORY_VERSION_KEY)
+    return version
+
+
+def get_categories():
+    """Return ``(version, categories)`` for the search form selects."""
+    global _categories
+    from .models import Category
+
+    version = categories_version()
+    if _categories[0] != version:
+        items = list(Category.objects.only("id", "name").order_by("pk"))
+        _categories = (version, items)
+    return version, _categories[1]
+
+
+def bump_categories_version():
+    shared_cache(DEFAULT_CACHE_ALIAS).set(
+        CATEGORY_VERSION_KEY, uuid.uuid4().hex, None
+    )
+
+
+def invalidate_categories():
+    bump_twice(bump_categories_version)
+
+
+def groups_version():
+    cache = shared_cache(DEFAULT_CACHE_ALIAS)
+    version = cache.get(GROUPS_VERSION_KEY)
+    if version is None:
+        cache.add(GROUPS_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(GROUPS_VERSION_KEY)
+    return version
+
+
+def in_group(user, name):
+    """
+    ``user.groups.filter(name=name).exists()``, cached per user. An
+    authorization check, so the entries live in the shared tier only: a
+    local copy would keep granting a removed group for a while.
+    """
+    cache = shared_cache(DEFAULT_CACHE_ALIAS)
+    key = f"groups:{groups_version()}:{user.pk}:{name}"
+    member = cache.get(key)
+    if member is None:
+        member = user.groups.filter(name=name).exists()
+        cache.add(key, member)
+    return member
+
+
+def bump_groups_version():
+    shared_cache(DEFAULT_CACHE_ALIAS).set(
+        GROUPS_VERSION_KEY, uuid.uuid4().hex, None
+    )
+
+
+def invalidate_groups():
+    # A membership a request cached before the commit would keep granting
+    # a removed group until its timeout
+    bump_twice(bump_groups_version)
+
+
+# FULL-PAGE CACHE
+PAGE_CACHE = "pages"
+
+
+def page_generation(name):
+    cache = shared_cache(PAGE_CACHE)
+    key = f"pages:{name}:generation"
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        generation = cache.get(key)
+    return generation
+
+
+def page_cache_key(name, *vary):
+    digest = hashlib.sha1(json.dumps(vary).encode()).hexdigest()
+    return f"pages:{name}:{page_generation(name)}:{digest}"
+
+
+def get_page(key):
+    return caches[PAGE_CACHE].get(key)
+
+
+def set_page(key, response):
+    caches[PAGE_CACHE].add(key, response)
+
+
+def bump_page_generations(*names):
+    shared_cache(PAGE_CACHE).set_many(
+        {f"pages:{name}:generation": uuid.uuid4().hex for name in names},
+        None,
+    )
+
+
+def purge_pages(*names):
+    """Orphan every cached variant of the named pages."""
+    bump_twice(bump_page_generations, *names)
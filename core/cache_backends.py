@@ -0,0 +1,207 @@
+import pickle
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.module_loading import import_string
+
+# Shared key changed by every write that can leave other processes with a
+# stale local copy
+STAMP_KEY = "two-tier:stamp"
+MISSING = object()
+
+# One local tier per location, shared by the threads of a process like
+# LocMemCache does
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+class LocalTier:
+    """Bounded LRU of pickled values with per-entry expiry."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stamp = None
+        self.synced = float("-inf")
+        self.stats = Counter(hits=0, shared_hits=0, misses=0, evictions=0)
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is not None and item[0] <= time.monotonic():
+                del self.entries[key]
+                item = None
+            if item is None:
+                return MISSING
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+        return pickle.loads(item[1])
+
+    def set(self, key, value, timeout):
+        if timeout <= 0:
+            self.delete(key)
+            return
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.entries[key] = (time.monotonic() + timeout, data)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+
+class TwoTierCache(BaseCache):
+    """
+    An in-process LRU (``MAX_ENTRIES``, entries kept ``LOCAL_TIMEOUT``
+    seconds at most) in front of the ``SHARED`` cache, so repeated reads
+    of small objects don't pay a round trip each.
+
+    Writes go through to both tiers. ``set``, ``delete`` and ``incr``
+    also replace a version stamp in the shared cache, and every process
+    drops its local entries when it finds the stamp changed, checking at
+    most every ``SYNC_INTERVAL`` seconds. ``add`` leaves the stamp alone:
+    it only fills a missing key, which no process can hold a stale copy
+    of. A local read is at most ``SYNC_INTERVAL`` seconds behind the
+    other workers.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self.local_timeout = options.get("LOCAL_TIMEOUT", 30)
+        self.sync_interval = options.get("SYNC_INTERVAL", 1)
+
+        shared = dict(options.get("SHARED", {}))
+        backend = import_string(
+            shared.pop(
+                "BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+            )
+        )
+        shared.setdefault("TIMEOUT", params.get("TIMEOUT", 300))
+        shared.setdefault("KEY_PREFIX", params.get("KEY_PREFIX", ""))
+        self.shared = backend(shared.pop("LOCATION", location), shared)
+
+        with _tiers_lock:
+            self.local = _tiers.setdefault(
+                location, LocalTier(self._max_entries)
+            )
+
+    def sync(self):
+        local = self.local
+        now = time.monotonic()
+        if now - local.synced < self.sync_interval:
+            return
+        stamp = self.shared.get(STAMP_KEY)
+        if stamp is None:
+            self.shared.add(STAMP_KEY, uuid.uuid4().hex, None)
+            stamp = self.shared.get(STAMP_KEY)
+        with local.lock:
+            if stamp != local.stamp:
+                local.entries.clear()
+                local.stamp = stamp
+            local.synced = now
+
+    def bump(self):
+        # This process drops its own entries at the next sync as well, it
+        # can't tell whether another write raced with this one
+        self.shared.set(STAMP_KEY, uuid.uuid4().hex, None)
+
+    def local_ttl(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return self.local_timeout
+        return min(timeout, self.local_timeout)
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        self.sync()
+        value = self.local.get(local_key)
+        if value is not MISSING:
+            return value
+
+        value = self.shared.get(key, MISSING, version=version)
+        if value is MISSING:
+            self.local.count("misses")
+            return default
+        self.local.count("shared_hits")
+        self.local.set(local_key, value, self.local_timeout)
+        return value
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self.local.set(local_key, value, self.local_ttl(timeout))
+        return added
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self.make_and_validate_key(key, version=version)
+        self.shared.set(key, value, timeout, version=version)
+        self.bump()
+        self.local.set(local_key, value, self.local_ttl(timeout))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        self.bump()
+        for key, value in data.items():
+            local_key = self.make_and_validate_key(key, version=version)
+            if key in failed:
+                self.local.delete(local_key)
+            else:
+                self.local.set(local_key, value, self.local_ttl(timeout))
+        return failed
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self.local.delete(self.make_and_validate_key(key, version=version))
+        deleted = self.shared.delete(key, version=version)
+        self.bump()
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        for key in keys:
+            self.local.delete(self.make_and_validate_key(key, version=version))
+        self.shared.delete_many(keys, version=version)
+        self.bump()
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version=version) is not MISSING
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        self.bump()
+        local_key = self.make_and_validate_key(key, version=version)
+        self.local.set(local_key, value, self.local_timeout)
+        return value
+
+    def clear(self):
+        self.local.clear()
+        # Drops the stamp too, so every process clears on its next sync
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+    def stats(self):
+        """This process's counters for the local tier."""
+        with self.local.lock:
+            return {**self.local.stats, "entries": len(self.local.entries)}
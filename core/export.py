@@ -0,0 +1,76 @@
+import csv
+import json
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.http import StreamingHttpResponse
+
+# Flat projection of a subscriber, its company and categories
+SUBSCRIBER_COLUMNS = (
+    "username",
+    "in_charge",
+    "active",
+    "website",
+    "instagram",
+    "facebook",
+    "wpp",
+    "updatedAt",
+)
+COMPANY_COLUMNS = {
+    "name": "company__name",
+    "razao": "company__razao",
+    "document": "company__document",
+    "email": "company__email",
+    "tel1": "company__tel1",
+    "tel2": "company__tel2",
+    "uf": "company__uf",
+    "cidade": "company__cidade",
+    "endereco": "company__endereco",
+    "categoria1": "company__categoria1__name",
+    "categoria2": "company__categoria2__name",
+}
+COLUMNS = SUBSCRIBER_COLUMNS + tuple(COMPANY_COLUMNS)
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+}
+
+
+def export_rows(queryset, chunk_size=2000):
+    """
+    Stream the rows of a Subscriber queryset as flat dicts through a
+    server-side cursor, so memory doesn't grow with the directory.
+    """
+    related = {name: F(lookup) for name, lookup in COMPANY_COLUMNS.items()}
+    rows = queryset.order_by("pk").values(*SUBSCRIBER_COLUMNS, **related)
+    return rows.iterator(chunk_size=chunk_size)
+
+
+class Echo:
+    """File-like object handing back what csv.writer writes to it."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow([row[column] for column in COLUMNS])
+
+
+def stream_jsonl(rows):
+    for row in rows:
+        row = {column: row[column] for column in COLUMNS}
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+def export_response(queryset, format, filename="assinantes"):
+    stream = stream_csv if format == "csv" else stream_jsonl
+    response = StreamingHttpResponse(
+        stream(export_rows(queryset)), content_type=FORMATS[format]
+    )
+    response.headers[
+        "Content-Disposition"
+    ] = f'attachment; filename="{filename}.{format}"'
+    return response
@@ -1,8 +1,18 @@
 from django import forms
-from .models import Subscriber
+from django.contrib.admin.helpers import ActionForm
+from .models import Category, Subscriber
+from .uploadhandler import UPLOAD_LIMITS
+
+
+def size_error(max_size):
+    return f"The image size exceeds the maximum allowed size of {max_size}KB."
 
 
 class SubscriberForm(forms.ModelForm):
+    # {field: max size in KB} of files dropped by SizeLimitUploadHandler,
+    # set per request by SubscriberAdmin.get_form
+    upload_errors = {}
+
     class Meta:
         model = Subscriber
         fields = "__all__"
@@ -10,25 +20,27 @@ class SubscriberForm(forms.ModelForm):
     def clean(self):
         cleaned_data = super().clean()
 
-        logo = cleaned_data.get("logo", False)
-        if logo:
-            logo_max_size = 200  # Maximum size in kilobytes
-            max_size_bytes = logo_max_size * 1024  # Convert to bytes
-            if logo.size > max_size_bytes:
-                self.add_error(
-                    "logo",
-                    f"The image size exceeds the maximum allowed size of {logo_max_size}KB.",  # noqa
-                )
-        for i in range(4):
-            photo_key = "photo" + str(i + 1)
-            photo = cleaned_data.get(photo_key, False)
-            if photo:
-                photo_max_size = 500
-                max_size_bytes = photo_max_size * 1024  # Convert to bytes
-                if photo.size > max_size_bytes:
-                    self.add_error(
-                        photo_key,
-                        f"The image size exceeds the maximum allowed size of {photo_max_size}KB.",  # noqa
-                    )
+        for key, max_size in UPLOAD_LIMITS.items():
+            if key in self.upload_errors:
+                # The file never arrived, drop the "required" error
+                self.errors.pop(key, None)
+                self.add_error(key, size_error(max_size))
+                continue
+
+            image = cleaned_data.get(key, False)
+            max_size_bytes = max_size * 1024  # Convert to bytes
+            if image and image.size > max_size_bytes:
+                self.add_error(key, size_error(max_size))
 
         return cleaned_data
+
+
+class CategoryActionForm(ActionForm):
+    """Changelist action bar with the categories the recategorize applies."""
+
+    categoria1 = forms.ModelChoiceField(
+        Category.objects.all(), required=False, label="Categoria 1"
+    )
+    categoria2 = forms.ModelChoiceField(
+        Category.objects.all(), required=False, label="Categoria 2"
+    )
@@ -0,0 +1,77 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Pillow releases the GIL while resizing and encoding, so
+            # threads render several uploads in parallel across cores
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_JOBS_WORKERS,
+                thread_name_prefix="image-jobs",
+            )
+    return _executor
+
+
+def enqueue_image_job(field, file_name):
+    """
+    Record the rendering of ``file_name`` variations and hand it to the
+    worker pool once the current transaction commits.
+    """
+    from .models import ImageJob
+
+    job = ImageJob.objects.create(field=str(field), file_name=file_name)
+    transaction.on_commit(lambda: submit(job.pk))
+    return job
+
+
+def submit(pk):
+    if not settings.IMAGE_JOBS_WORKERS:
+        return run_image_job(pk)
+    return get_executor().submit(run_in_thread, pk)
+
+
+def run_in_thread(pk):
+    close_old_connections()
+    try:
+        return run_image_job(pk)
+    finally:
+        connection.close()
+
+
+def run_image_job(pk):
+    """Render every variation of the job image. Finished jobs are deleted."""
+    from .models import ImageJob
+
+    # Claiming with an UPDATE keeps two workers from running the same job
+    jobs = ImageJob.objects.filter(pk=pk, status=ImageJob.PENDING)
+    if not jobs.update(status=ImageJob.RUNNING):
+        return False
+
+    job = ImageJob.objects.get(pk=pk)
+    try:
+        field = job.get_field()
+        # Uploads are content-addressed, an existing variation is current
+        for variation in field.variations.values():
+            field.attr_class.render_variation(
+                job.file_name, variation, replace=False, storage=field.storage
+            )
+    except Exception as e:
+        logger.exception("Image job %s failed", pk)
+        job.status = ImageJob.FAILED
+        job.error = repr(e)
+        job.save(update_fields=["status", "error", "updatedAt"])
+        return False
+
+    job.delete()
+    return True
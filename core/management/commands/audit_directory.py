@@ -0,0 +1,147 @@
+import json
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import partial
+from itertools import islice
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.models import Company, Subscriber
+from core.utils.audit import (
+    COMPANY_COLUMNS,
+    SUBSCRIBER_COLUMNS,
+    audit_companies,
+    audit_subscribers,
+)
+
+
+def chunked(rows, size):
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        "Check every company and subscriber against the model rules, in "
+        "parallel across CPU cores, and write a JSON report"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--report",
+            default=settings.AUDIT_REPORT_PATH,
+            help="JSON report path, - for stdout.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Worker processes, 0 audits in this process.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Rows sent to a worker at a time.",
+        )
+        parser.add_argument(
+            "--check-digits",
+            action="store_true",
+            help="Also verify the CPF/CNPJ check digits.",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        self.chunk_size = options["chunk_size"]
+        self.problems = []
+        self.counts = {}
+        # {uppercased razao: pks}, rows saved before set_uppercase may
+        # only differ by case
+        self.razoes = defaultdict(list)
+
+        workers = options["workers"]
+        self.executor = ProcessPoolExecutor(workers) if workers else None
+        self.pending = set()
+        self.limit = 2 * max(workers, 1)
+        try:
+            self.audit(
+                Company,
+                ("razao", *COMPANY_COLUMNS),
+                partial(audit_companies, check_digits=options["check_digits"]),
+            )
+            self.audit(
+                Subscriber,
+                SUBSCRIBER_COLUMNS,
+                partial(audit_subscribers, media_root=settings.MEDIA_ROOT),
+            )
+            self.collect(self.pending)
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown(cancel_futures=True)
+
+        for razao, pks in self.razoes.items():
+            if len(pks) > 1:
+                self.problems += [
+                    ("company", str(pk), "razao", f"{razao} duplicada.")
+                    for pk in pks
+                ]
+
+        elapsed = time.monotonic() - started
+        self.write_report(options["report"], elapsed)
+        summary = (
+            f"{self.counts['company']} entidades e "
+            f"{self.counts['subscriber']} assinantes auditados em "
+            f"{elapsed:.1f}s, {len(self.problems)} problemas"
+        )
+        # Keep stdout parseable when the report goes there
+        output = self.stderr if options["report"] == "-" else self.stdout
+        output.write(
+            self.style.WARNING(summary)
+            if self.problems
+            else self.style.SUCCESS(summary)
+        )
+
+    def audit(self, model, columns, check):
+        name = model._meta.model_name
+        self.counts[name] = 0
+        rows = model.objects.order_by().values_list(*columns)
+        for chunk in chunked(rows.iterator(chunk_size=2000), self.chunk_size):
+            self.counts[name] += len(chunk)
+            if model is Company:
+                for razao, pk, *_ in chunk:
+                    self.razoes[razao.upper()].append(pk)
+                chunk = [row[1:] for row in chunk]
+
+            if self.executor is None:
+                self.problems += check(chunk)
+                continue
+            # Bounded, so a fast database doesn't queue the whole table
+            if len(self.pending) >= self.limit:
+                done, self.pending = wait(
+                    self.pending, return_when=FIRST_COMPLETED
+                )
+                self.collect(done)
+            self.pending.add(self.executor.submit(check, chunk))
+
+    def collect(self, futures):
+        for future in futures:
+            self.problems += future.result()
+
+    def write_report(self, path, elapsed):
+        report = {
+            "elapsed": round(elapsed, 3),
+            "counts": self.counts,
+            "problems": [
+                dict(zip(("model", "pk", "field", "message"), problem))
+                for problem in sorted(self.problems)
+            ],
+        }
+        if path == "-":
+            self.stdout.write(json.dumps(report, ensure_ascii=False))
+            return
+        with open(path, "w") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.search.ngram import search_index
+
+
+class Command(BaseCommand):
+    help = "Build the company name n-gram index and save it as a snapshot"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default=settings.SEARCH_INDEX_PATH,
+            help="Snapshot path loaded by the app at startup.",
+        )
+
+    def handle(self, *args, **options):
+        search_index.build_from_db()
+        search_index.dump(options["output"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(search_index.documents)} assinantes e "
+                f"{len(search_index.postings)} n-gramas salvos em "
+                f"{options['output']}"
+            )
+        )
@@ -0,0 +1,113 @@
+import os
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.models import IMAGE_FIELDS, Subscriber, stored_names
+
+
+class Command(BaseCommand):
+    help = "Report or delete media files no subscriber references"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="List the orphaned files without deleting them.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=8,
+            help="Threads scanning directories in parallel.",
+        )
+        parser.add_argument(
+            "--min-age",
+            type=int,
+            default=60 * 60,
+            help="Spare files modified less than this many seconds ago, "
+            "uploads whose transaction may not have committed yet.",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        self.dry_run = options["dry_run"]
+        self.list_orphans = self.dry_run or options["verbosity"] > 1
+        self.cutoff = time.time() - options["min_age"]
+        self.root = settings.MEDIA_ROOT
+        self.referenced = self.referenced_names()
+
+        stats = Counter()
+        if os.path.isdir(self.root):
+            stats = self.sweep(options["workers"])
+
+        elapsed = time.monotonic() - started
+        rate = stats["scanned"] / elapsed if elapsed else 0
+        action = "a remover" if self.dry_run else "removidos"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{stats['scanned']} arquivos verificados em {elapsed:.1f}s "
+                f"({rate:.0f}/s), {stats['orphans']} órfãos {action} "
+                f"({stats['bytes'] / 1024:.0f}KB), "
+                f"{stats['recent']} recentes ignorados"
+            )
+        )
+
+    def referenced_names(self):
+        """Every stored image and variation, from one streamed query."""
+        names = set()
+        rows = Subscriber.objects.values_list(*IMAGE_FIELDS)
+        for row in rows.iterator(chunk_size=2000):
+            for name in row:
+                if name:
+                    names.update(stored_names(name))
+        return names
+
+    def sweep(self, workers):
+        # Each task scans one directory and returns its subdirectories,
+        # which are queued in turn, so deep trees spread over the pool
+        stats = Counter()
+        with ThreadPoolExecutor(workers) as executor:
+            pending = {executor.submit(self.sweep_dir, self.root)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    dir_stats, orphans, subdirs = future.result()
+                    stats.update(dir_stats)
+                    if self.list_orphans:
+                        for name in orphans:
+                            self.stdout.write(name)
+                    pending.update(
+                        executor.submit(self.sweep_dir, path)
+                        for path in subdirs
+                    )
+        return stats
+
+    def sweep_dir(self, path):
+        stats = Counter()
+        orphans = []
+        subdirs = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                    continue
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+
+                stats["scanned"] += 1
+                name = os.path.relpath(entry.path, self.root)
+                if name.replace(os.sep, "/") in self.referenced:
+                    continue
+                stat = entry.stat()
+                if stat.st_mtime > self.cutoff:
+                    stats["recent"] += 1
+                    continue
+
+                stats["orphans"] += 1
+                stats["bytes"] += stat.st_size
+                orphans.append(name)
+                if not self.dry_run:
+                    os.remove(entry.path)
+        return stats, orphans, subdirs
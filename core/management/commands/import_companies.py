@@ -0,0 +1,285 @@
+import csv
+import json
+import os
+import sys
+from itertools import islice
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from core.models import Category, Company, Subscriber
+
+COMPANY_FIELDS = (
+    "name",
+    "razao",
+    "document",
+    "is_cpf",
+    "email",
+    "tel1",
+    "tel2",
+    "uf",
+    "cidade",
+    "endereco",
+)
+SUBSCRIBER_FIELDS = (
+    "username",
+    "in_charge",
+    "desc",
+    "opening_h",
+    "wpp",
+    "website",
+    "instagram",
+    "facebook",
+)
+# Resolved by the command or not part of an import
+COMPANY_EXCLUDE = ["user", "categoria1", "categoria2", "search_key"]
+SUBSCRIBER_EXCLUDE = [
+    "user",
+    "company",
+    "logo",
+    "photo1",
+    "photo2",
+    "photo3",
+    "photo4",
+]
+
+
+def present(row, fields):
+    """The ``fields`` given in ``row``, strings stripped."""
+    values = {}
+    for key in fields:
+        value = row.get(key)
+        if isinstance(value, str):
+            value = value.strip()
+        if value not in (None, ""):
+            values[key] = value
+    return values
+
+
+class Command(BaseCommand):
+    help = (
+        "Import companies, and optionally their subscribers, from a CSV or "
+        "JSONL file"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSONL file, - for stdin.")
+        parser.add_argument(
+            "--format",
+            choices=("csv", "jsonl"),
+            help="Input format, guessed from the extension by default.",
+        )
+        parser.add_argument(
+            "--user",
+            required=True,
+            help="Username recorded as the author of the imported rows.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows validated and inserted together.",
+        )
+        parser.add_argument(
+            "--report",
+            help="Write the rejected rows to this CSV instead of stderr.",
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            self.user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"Usuário {options['user']} não existe")
+
+        self.categories = {
+            category.name: category for category in Category.objects.all()
+        }
+        # Keys taken by earlier rows of the same file
+        self.seen = {"document": set(), "razao": set(), "username": set()}
+        self.errors = []
+        created = 0
+
+        rows = self.read(options["path"], options["format"])
+        try:
+            while True:
+                batch = list(islice(rows, options["batch_size"]))
+                if not batch:
+                    break
+                created += self.import_batch(batch)
+        finally:
+            # The rows rejected so far are reported even if the run dies
+            self.write_report(options["report"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{created} entidades importadas, {len(self.errors)} erros"
+            )
+        )
+
+    def read(self, path, format):
+        """Yield ``(line, row)`` without loading the whole file."""
+        if format is None:
+            format = "jsonl" if path.endswith((".jsonl", ".json")) else "csv"
+        f = sys.stdin if path == "-" else open(path, newline="")
+        with f:
+            if format == "csv":
+                # Line 1 is the header
+                for line, row in enumerate(csv.DictReader(f), start=2):
+                    yield line, row
+            else:
+                for line, text in enumerate(f, start=1):
+                    if not text.strip():
+                        continue
+                    try:
+                        row = json.loads(text)
+                    except ValueError:
+                        row = None
+                    # Valid JSON but not an object: [1], "x", 3
+                    yield line, row if isinstance(row, dict) else None
+
+    def import_batch(self, batch):
+        companies = []
+        subscribers = []
+        for line, row in batch:
+            if row is None:
+                self.reject(
+                    line,
+                    ValidationError({"__all__": ["Objeto JSON inválido."]}),
+                )
+                continue
+            try:
+                company, subscriber = self.build(row)
+            except ValidationError as e:
+                self.reject(line, e)
+                continue
+            companies.append((line, company))
+            if subscriber is not None:
+                subscribers.append((line, subscriber))
+
+        rejected = self.check_unique(companies, subscribers)
+        companies = [(ln, c) for ln, c in companies if ln not in rejected]
+        subscribers = dict(subscribers)
+        try:
+            # Both refresh the caches and the search index once per batch
+            self.insert(companies, subscribers)
+        except IntegrityError:
+            # A clash check_unique can't see, like a row another process
+            # wrote meanwhile: retry the batch one row at a time
+            companies = [
+                row for row in companies if self.insert_row(row, subscribers)
+            ]
+        return len(companies)
+
+    def insert(self, companies, subscribers):
+        with transaction.atomic():
+            Company.objects.bulk_create([c for _, c in companies])
+            Subscriber.objects.bulk_create(
+                [subscribers[ln] for ln, _ in companies if ln in subscribers]
+            )
+
+    def insert_row(self, row, subscribers):
+        try:
+            self.insert([row], subscribers)
+        except IntegrityError as e:
+            self.reject(row[0], ValidationError({"__all__": [str(e)]}))
+            return False
+        return True
+
+    def build(self, row):
+        """
+        Validate a row with the model field rules and normalize it, so the
+        uniqueness checks see the values bulk_create will insert.
+        """
+        company = Company(user=self.user, **present(row, COMPANY_FIELDS))
+        errors = {}
+        try:
+            company.full_clean(
+                exclude=COMPANY_EXCLUDE,
+                validate_unique=False,
+                validate_constraints=False,
+            )
+        except ValidationError as e:
+            errors.update(e.message_dict)
+
+        for key, required in (("categoria1", True), ("categoria2", False)):
+            name = (row.get(key) or "").strip().upper()
+            if name:
+                category = self.categories.get(name)
+                if category is None:
+                    errors[key] = [f"Categoria {name} não existe."]
+                setattr(company, key, category)
+            elif required:
+                errors[key] = ["Este campo é obrigatório."]
+
+        Company.objects.normalize([company])
+
+        subscriber = None
+        if row.get("username"):
+            subscriber = Subscriber(
+                user=self.user,
+                company=company,
+                **present(row, SUBSCRIBER_FIELDS),
+            )
+            try:
+                subscriber.full_clean(
+                    exclude=SUBSCRIBER_EXCLUDE,
+                    validate_unique=False,
+                    validate_constraints=False,
+                )
+            except ValidationError as e:
+                errors.update(e.message_dict)
+            Subscriber.objects.normalize([subscriber], ["username"])
+
+        if errors:
+            raise ValidationError(errors)
+        return company, subscriber
+
+    def check_unique(self, companies, subscribers):
+        """
+        Lines clashing with the database or an earlier row, checked with
+        one query per unique field for the whole batch.
+        """
+        checks = (
+            (Company, "document", {ln: c.document for ln, c in companies}),
+            (Company, "razao", {ln: c.razao for ln, c in companies}),
+            (
+                Subscriber,
+                "username",
+                {ln: s.username for ln, s in subscribers},
+            ),
+        )
+        rejected = set()
+        for model, field, values in checks:
+            taken = set(
+                model.objects.filter(
+                    **{f"{field}__in": values.values()}
+                ).values_list(field, flat=True)
+            )
+            for line, value in values.items():
+                if value in taken or value in self.seen[field]:
+                    self.reject(
+                        line,
+                        ValidationError({field: [f"{value} já existe."]}),
+                    )
+                    rejected.add(line)
+                self.seen[field].add(value)
+        return rejected
+
+    def reject(self, line, error):
+        for field, messages in error.message_dict.items():
+            for message in messages:
+                self.errors.append((line, field, message))
+
+    def write_report(self, path):
+        if path:
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(("linha", "campo", "erro"))
+                writer.writerows(sorted(self.errors))
+            if self.errors:
+                self.stderr.write(
+                    f"Linhas rejeitadas em {os.path.abspath(path)}"
+                )
+            return
+        for line, field, message in sorted(self.errors):
+            self.stderr.write(f"Linha {line}: {field}: {message}")
@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.jobs import run_image_job, run_in_thread
+from core.models import ImageJob
+
+
+class Command(BaseCommand):
+    help = "Render the image variations still waiting in the job queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=settings.IMAGE_JOBS_WORKERS or 1,
+            help="Number of worker threads, 0 to run in this thread.",
+        )
+        parser.add_argument(
+            "--retry-failed",
+            action="store_true",
+            help="Queue failed jobs again before processing.",
+        )
+
+    def handle(self, *args, **options):
+        # Jobs left running by a stopped process are picked up again
+        stale = [ImageJob.RUNNING]
+        if options["retry_failed"]:
+            stale.append(ImageJob.FAILED)
+        ImageJob.objects.filter(status__in=stale).update(
+            status=ImageJob.PENDING, error=""
+        )
+
+        pks = ImageJob.objects.filter(status=ImageJob.PENDING).values_list(
+            "pk", flat=True
+        )
+        if options["workers"] > 0:
+            with ThreadPoolExecutor(options["workers"]) as executor:
+                results = list(executor.map(run_in_thread, pks.iterator()))
+        else:
+            results = [run_image_job(pk) for pk in pks]
+
+        done = sum(1 for result in results if result)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{done} imagens processadas, {len(results) - done} falharam"
+            )
+        )
@@ -0,0 +1,99 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from core.models import IMAGE_FIELDS, Subscriber
+from core.utils.index import is_blob
+from core.utils.images import reencode_image
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-encode the logos and photos stored before content-addressed "
+        "uploads as progressive JPEGs without metadata, in parallel across "
+        "CPU cores"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--quality", type=int, default=82)
+        parser.add_argument(
+            "--webp",
+            action="store_true",
+            help="Also write a .webp sibling of every image.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Worker processes.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default=settings.REENCODE_CHECKPOINT_PATH,
+            help="File listing the images already done, to resume a run.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore the checkpoint and process every image again.",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        checkpoint = options["checkpoint"]
+        if options["restart"] and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        paths = self.pending_paths(checkpoint)
+        reencode = partial(
+            reencode_image, quality=options["quality"], webp=options["webp"]
+        )
+        done = failed = before = after = 0
+
+        executor = ProcessPoolExecutor(options["workers"])
+        with executor, open(checkpoint, "a") as log:
+            results = executor.map(reencode, paths, chunksize=16)
+            for path, size, new_size, error in results:
+                if error:
+                    failed += 1
+                    self.stderr.write(f"{path}: {error}")
+                    continue
+                done += 1
+                before += size
+                after += new_size
+                log.write(f"{path}\n")
+                log.flush()
+
+        elapsed = time.monotonic() - started
+        saved = before - after
+        percent = 100 * saved / before if before else 0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{done} imagens recodificadas em {elapsed:.1f}s, "
+                f"{failed} falharam, {saved / 1024:.0f}KB economizados "
+                f"({percent:.1f}%)"
+            )
+        )
+
+    def pending_paths(self, checkpoint):
+        finished = set()
+        if os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                finished = {line.rstrip("\n") for line in f}
+
+        storage = Subscriber._meta.get_field("logo").storage
+        names = set()
+        rows = Subscriber.objects.values_list(*IMAGE_FIELDS)
+        for row in rows.iterator(chunk_size=2000):
+            # A blob's name is the hash of its content, which dedupes
+            # uploads and lets serve_media cache it forever: never rewrite it
+            names.update(name for name in row if name and not is_blob(name))
+
+        paths = (storage.path(name) for name in sorted(names))
+        return [
+            path
+            for path in paths
+            if path not in finished and os.path.exists(path)
+        ]
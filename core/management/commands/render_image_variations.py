@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from core.models import IMAGE_FIELDS, Subscriber
+
+
+class Command(BaseCommand):
+    help = "Render the thumbnail and WebP variations of existing images"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--replace",
+            action="store_true",
+            help="Render again variations that already exist.",
+        )
+
+    def handle(self, *args, **options):
+        fields = [Subscriber._meta.get_field(name) for name in IMAGE_FIELDS]
+        rows = Subscriber.objects.values_list(*IMAGE_FIELDS)
+        rendered = missing = 0
+
+        for names in rows.iterator(chunk_size=500):
+            for field, file_name in zip(fields, names):
+                if not file_name:
+                    continue
+                if not field.storage.exists(file_name):
+                    missing += 1
+                    self.stderr.write(f"Arquivo não encontrado: {file_name}")
+                    continue
+                for variation in field.variations.values():
+                    field.attr_class.render_variation(
+                        file_name,
+                        variation,
+                        replace=options["replace"],
+                        storage=field.storage,
+                    )
+                rendered += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{rendered} imagens processadas, {missing} não encontradas"
+            )
+        )
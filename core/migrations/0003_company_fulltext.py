@@ -0,0 +1,22 @@
+from django.db import migrations
+from core.search.backends import get_backend_class
+
+
+def install(apps, schema_editor):
+    connection = schema_editor.connection
+    get_backend_class(connection.vendor).install(connection)
+
+
+def uninstall(apps, schema_editor):
+    connection = schema_editor.connection
+    get_backend_class(connection.vendor).uninstall(connection)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0002_subscriber_ytb_id_alter_subscriber_company"),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
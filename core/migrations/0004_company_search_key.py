@@ -0,0 +1,48 @@
+# Generated by Django 4.2.2 on 2026-10-18 12:59
+
+from django.db import migrations, models
+from core.search.backends import PostgresBackend
+from core.utils.index import normalize
+
+
+def backfill_search_key(apps, schema_editor):
+    Company = apps.get_model("core", "Company")
+    companies = Company.objects.only("name", "razao").order_by("pk")
+    batch = list(companies[:1000])
+    while batch:
+        for company in batch:
+            company.search_key = normalize(f"{company.name} {company.razao}")
+        Company.objects.bulk_update(batch, ["search_key"])
+        batch = list(companies.filter(pk__gt=batch[-1].pk)[:1000])
+
+
+def reinstall_tsvector_index(apps, schema_editor):
+    # The tsvector expression became accent-insensitive
+    connection = schema_editor.connection
+    if connection.vendor == "postgresql":
+        PostgresBackend.uninstall(connection)
+        PostgresBackend.install(connection)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0003_company_fulltext"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="company",
+            name="search_key",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                editable=False,
+                max_length=141,
+                verbose_name="Chave de busca",
+            ),
+        ),
+        migrations.RunPython(backfill_search_key, migrations.RunPython.noop),
+        migrations.RunPython(
+            reinstall_tsvector_index, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.2 on 2026-10-18 13:02
+
+from django.db import migrations, models
+
+
+def pad_sqlite_dates(apps, schema_editor):
+    # SQLite keeps the copied "YYYY-MM-DD" text, which won't parse as a
+    # datetime; MySQL and Postgres convert the column themselves
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for table in ("core_category", "core_company", "core_subscriber"):
+        schema_editor.execute(
+            f'UPDATE {table} SET "updatedAt" = "updatedAt" || \' 00:00:00\' '
+            f'WHERE length("updatedAt") = 10'
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0004_company_search_key"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="category",
+            name="updatedAt",
+            field=models.DateTimeField(
+                auto_now=True, verbose_name="Data de atualização"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="company",
+            name="updatedAt",
+            field=models.DateTimeField(
+                auto_now=True, verbose_name="Data de atualização"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="subscriber",
+            name="updatedAt",
+            field=models.DateTimeField(
+                auto_now=True, verbose_name="Data de atualização"
+            ),
+        ),
+        migrations.RunPython(pad_sqlite_dates, migrations.RunPython.noop),
+    ]
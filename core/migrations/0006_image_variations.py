@@ -0,0 +1,142 @@
+# Generated by Django 4.2.2 on 2026-10-18 13:05
+
+import core.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0005_updatedat_datetime"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="subscriber",
+            name="logo",
+            field=core.models.ResponsiveImageField(
+                force_min_size=False,
+                help_text="Max size 200KB",
+                upload_to="logos/",
+                variations={
+                    "card": {"crop": False, "height": 400, "width": 400},
+                    "card_webp": {
+                        "crop": False,
+                        "height": 400,
+                        "kwargs": {"format": "WEBP", "quality": 80},
+                        "width": 400,
+                    },
+                    "thumb": {"crop": False, "height": 100, "width": 100},
+                    "thumb_webp": {
+                        "crop": False,
+                        "height": 100,
+                        "kwargs": {"format": "WEBP", "quality": 80},
+                        "width": 100,
+                    },
+                },
+            ),
+        ),
+        migrations.AlterField(
+            model_name="subscriber",
+            name="photo1",
+            field=core.models.ResponsiveImageField(
+                blank=True,
+                force_min_size=False,
+                help_text="Max size 500KB",
+                upload_to="photos/",
+                variations={
+                    "desktop": {"crop": False, "height": 900, "width": 1200},
+                    "desktop_webp": {
+                        "crop": False,
+                        "height": 900,
+                        "kwargs": {"format": "WEBP", "quality": 80},
+                        "width": 1200,
+                    },
+                    "mobile": {"crop": False, "height": 432, "width": 576},
+                    "mobile_webp": {
+                        "crop": False,
+                        "height": 432,
+                        "kwargs": {"format": "WEBP", "quality": 80},
+                        "width": 576,
+                    },
+                },
+            ),
+        ),
+        migrations.AlterField(
+            model_name="subscriber",
+            name="photo2",
+            field=core.models.ResponsiveImageField(
+                blank=True,
+                force_min_size=False,
+                help_text="Max size 500KB",
+                upload_to="photos/",
+                variations={
+                    "desktop": {"crop": False, "height": 900, "width": 1200},
+                    "desktop_webp": {
+                        "crop": False,
+                        "height": 900,
+                        "kwargs": {"format": "WEBP", "quality": 80},
+                        "width": 1200,
+                    },
+                    "mobile": {"crop": False, "height": 432, "width": 576},
+                    "mobile_webp": {
+                        "crop": False,
+                        "height": 432,
+                        "kwargs": {"format": "WEBP", "quality": 80},
+                        "width": 576,
+                    },
+                },
+            ),
+        ),
+        migrations.AlterField(
+            model_name="subscriber",
+            name="photo3",
+            field=core.models.ResponsiveImageField(
+                blank=True,
+                force_min_size=False,
+                help_text="Max size 500KB",
+                upload_to="photos/",
+                variations={
+                    "desktop": {"crop": False, "height": 900, "width": 1200},
+                    "desktop_webp": {
+                        "crop": False,
+                        "height": 900,
+                        "kwargs": {"format": "WEBP", "quality": 80},
+                        "width": 1200,
+                    },
+                    "mobile": {"crop": False, "height": 432, "width": 576},
+                    "mobile_webp": {
+                        "crop": False,
+                        "height": 432,
+                        "kwargs": {"format": "WEBP", "quality": 80},
+                        "width": 576,
+                    },
+                },
+            ),
+        ),
+        migrations.AlterField(
+            model_name="subscriber",
+            name="photo4",
+            field=core.models.ResponsiveImageField(
+                blank=True,
+                force_min_size=False,
+                help_text="Max size 500KB",
+                upload_to="photos/",
+                variations={
+                    "desktop": {"crop": False, "height": 900, "width": 1200},
+                    "desktop_webp": {
+                        "crop": False,
+                        "height": 900,
+                        "kwargs": {"format": "WEBP", "quality": 80},
+                        "width": 1200,
+                    },
+                    "mobile": {"crop": False, "height": 432, "width": 576},
+                    "mobile_webp": {
+                        "crop": False,
+                        "height": 432,
+                        "kwargs": {"format": "WEBP", "quality": 80},
+                        "width": 576,
+                    },
+                },
+            ),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2.2 on 2026-10-18 13:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0006_image_variations"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImageJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("field", models.CharField(max_length=100, verbose_name="Campo")),
+                ("file_name", models.CharField(max_length=255, verbose_name="Arquivo")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pendente"),
+                            ("running", "Em execução"),
+                            ("failed", "Falhou"),
+                        ],
+                        db_index=True,
+                        default="pending",
+                        max_length=10,
+                        verbose_name="Status",
+                    ),
+                ),
+                ("error", models.TextField(blank=True, verbose_name="Erro")),
+                (
+                    "createdAt",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Data de criação"
+                    ),
+                ),
+                (
+                    "updatedAt",
+                    models.DateTimeField(
+                        auto_now=True, verbose_name="Data de atualização"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Processamento de imagem",
+                "verbose_name_plural": "Processamentos de imagem",
+            },
+        ),
+    ]
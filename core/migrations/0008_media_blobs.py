@@ -0,0 +1,43 @@
+# Generated by Django 4.2.2 on 2026-10-18 13:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0007_image_jobs"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MediaBlob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        max_length=100, unique=True, verbose_name="Arquivo"
+                    ),
+                ),
+                ("refs", models.IntegerField(default=0, verbose_name="Referências")),
+                (
+                    "createdAt",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Data de criação"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Arquivo de mídia",
+                "verbose_name_plural": "Arquivos de mídia",
+            },
+        ),
+    ]
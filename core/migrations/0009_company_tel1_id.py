@@ -0,0 +1,16 @@
+# Generated by Django 4.2.2 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0008_media_blobs"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="company",
+            index=models.Index(fields=["tel1", "id"], name="company_tel1_id"),
+        ),
+    ]
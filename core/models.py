@@ -1,12 +1,44 @@
+import os
 import uuid
-import re
-from django.db import models
+from collections import Counter
+from django.apps import apps
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
-from django.core.exceptions import ValidationError
+from django.contrib.auth.models import Group
 from stdimage import JPEGField
-from django.dispatch import receiver
-from django.db.models.signals import pre_save
-from .utils.index import set_key
+from stdimage.models import JPEGFieldFile
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+from django.db.models.signals import (
+    pre_save,
+    post_save,
+    pre_delete,
+    post_delete,
+    m2m_changed,
+)
+from .utils.index import (
+    set_key,
+    file_names,
+    delete_on_commit,
+    is_blob,
+    normalize,
+)
+from .cache import (
+    invalidate_search,
+    invalidate_categories,
+    invalidate_groups,
+    purge_pages,
+)
+from .search.backends import uses_ngram_index
+from .search.ngram import search_index
+from .validators import (
+    digit_errors,
+    document_errors,
+    phone_errors,
+    username_errors,
+    validate_one,
+)
+from .jobs import enqueue_image_job
 
 ESTADO_CHOICES = (
     ("AC", "Acre"),
@@ -47,15 +79,7 @@ class UsernameField(models.CharField):
 
     def clean(self, value, model_instance):
         value = super().clean(value, model_instance)
-        if not re.match(r"[a-zA-Z]+[a-zA-Z_0-9]*$", value):
-            raise ValidationError(
-                "Username deve iniciar com uma letra. Não deve ter acentuação e pode conter números ou underscore _"  # noqa
-            )
-
-        if len(value) < 6:
-            raise ValidationError(
-                "Username muito curto. Mínimo de 6 caracteres"
-            )
+        validate_one(username_errors, value)
         return value
 
 
@@ -66,15 +90,7 @@ class PhoneField(models.CharField):
 
     def clean(self, value, model_instance):
         value = super().clean(value, model_instance)
-
-        # Check if the phone number matches the allowed formats
-        if not re.match(
-            r"^\((?:1[1-9]|9[1-9]|[2-8][0-9])\)(?:9\d{8}|\d{8})$", value
-        ):
-            raise ValidationError(
-                "Formato Inválido. Use (xx)xxxxxxxx ou (xx)9xxxxxxxx."
-            )
-
+        validate_one(phone_errors, value)
         return value
 
 
@@ -85,11 +101,277 @@ class DocumentField(models.CharField):
 
     def clean(self, value, model_instance):
         value = super().clean(value, model_instance)
+        validate_one(digit_errors, value)
+        return value
 
-        if not value.isdigit():
-            raise ValidationError("Apenas dígitos numéricos.")
 
-        return value
+def with_webp(sizes):
+    """
+    Build stdimage variations from ``{name: (width, height, crop)}``: a
+    JPEG ``name`` and a WebP ``name_webp`` rendition of each size.
+    """
+    variations = {}
+    for name, (width, height, crop) in sizes.items():
+        size = {"width": width, "height": height, "crop": crop}
+        variations[name] = size
+        variations[f"{name}_webp"] = {
+            **size,
+            "kwargs": {"format": "WEBP", "quality": 80},
+        }
+    return variations
+
+
+LOGO_VARIATIONS = with_webp(
+    {
+        "thumb": (100, 100, False),  # partials/table.html icon (50px @2x)
+        "card": (400, 400, False),
+    }
+)
+PHOTO_VARIATIONS = with_webp(
+    {
+        "mobile": (576, 432, False),  # partials/carousel.html
+        "desktop": (1200, 900, False),
+    }
+)
+
+
+class ResponsiveImageFieldFile(JPEGFieldFile):
+    @classmethod
+    def get_variation_name(cls, file_name, variation_name):
+        path = super().get_variation_name(file_name, variation_name)
+        if variation_name.endswith("_webp"):
+            return os.path.splitext(path)[0] + ".webp"
+        return path
+
+
+class ResponsiveImageField(JPEGField):
+    """
+    JPEGField whose ``*_webp`` variations are saved as .webp files. The
+    variations are rendered by the image job queue once the upload is
+    committed instead of inside the request.
+    """
+
+    attr_class = ResponsiveImageFieldFile
+
+    def __init__(self, *args, render_variations=None, **kwargs):
+        if render_variations is None:
+            render_variations = self.defer_variations
+        super().__init__(*args, render_variations=render_variations, **kwargs)
+
+    def generate_filename(self, instance, filename):
+        # Content-addressed names are shared by every field, no upload_to
+        if is_blob(filename):
+            return self.storage.generate_filename(filename)
+        return super().generate_filename(instance, filename)
+
+    def defer_variations(self, file_name, variations, storage):
+        enqueue_image_job(self, file_name)
+        return False
+
+
+IMAGE_FIELDS = ("logo", "photo1", "photo2", "photo3", "photo4")
+
+
+# Sent once by the bulk writes of DirectoryQuerySet, which bypass the
+# per-row signals, with the pks written (None when the database didn't
+# return them)
+directory_changed = Signal()
+
+
+# QUERYSETS
+class DirectoryQuerySet(models.QuerySet):
+    """
+    ``bulk_create``, ``bulk_update`` and ``update`` applying the rules
+    save() gets from the pre_save receivers, then sending a single
+    ``directory_changed`` for what the post_save receivers do per row.
+    """
+
+    # Fields update() writes row by row, through bulk_update, when given
+    # plain values
+    row_fields = ()
+
+    def normalize(self, objs, fields=None):
+        """
+        Apply the model rules to ``objs`` in place before writing
+        ``fields`` (all of them when None). Return the other fields the
+        rules changed.
+        """
+        return []
+
+    def update_media(self, objs):
+        """Bookkeeping of ``normalize`` that waits for the write."""
+
+    def normalize_values(self, values):
+        """Apply the model rules to the ``values`` of an UPDATE."""
+        return values
+
+    def changed(self, pks):
+        if pks is None or pks:
+            directory_changed.send(sender=self.model, pks=pks)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        # The on_commit hooks normalize() registers belong to this write
+        with transaction.atomic(using=self.db):
+            self.normalize(objs)
+            objs = super().bulk_create(objs, *args, **kwargs)
+            self.update_media(objs)
+        pks = [obj.pk for obj in objs]
+        self.changed(None if None in pks else pks)
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        fields = list(fields)
+        # auto_now is only applied by save()
+        now = timezone.now()
+        for obj in objs:
+            obj.updatedAt = now
+        with transaction.atomic(using=self.db):
+            fields += self.normalize(objs, fields)
+            fields = list(dict.fromkeys([*fields, "updatedAt"]))
+            # The plain manager, so its UPDATEs don't come back to update()
+            rows = self.model._base_manager.using(self.db).bulk_update(
+                objs, fields, *args, **kwargs
+            )
+            self.update_media(objs)
+        self.changed([obj.pk for obj in objs])
+        return rows
+
+    def update(self, **kwargs):
+        kwargs.setdefault("updatedAt", timezone.now())
+        kwargs = self.normalize_values(kwargs)
+        pks = list(self.values_list("pk", flat=True))
+        if any(isinstance(kwargs.get(key), str) for key in self.row_fields):
+            objs = list(
+                self.model._base_manager.using(self.db).filter(pk__in=pks)
+            )
+            for obj in objs:
+                for key, value in kwargs.items():
+                    setattr(obj, key, value)
+            return self.bulk_update(objs, kwargs)
+
+        count = super().update(**kwargs)
+        self.changed(pks)
+        return count
+
+
+class CompanyQuerySet(DirectoryQuerySet):
+    # search_key is computed from both
+    row_fields = ("name", "razao")
+
+    def normalize(self, objs, fields=None):
+        if fields is not None and not set(self.row_fields) & set(fields):
+            return []
+        for obj in objs:
+            obj.name = obj.name.upper()
+            obj.razao = obj.razao.upper()
+            obj.search_key = normalize(f"{obj.name} {obj.razao}")
+        return ["name", "razao", "search_key"]
+
+
+class CategoryQuerySet(DirectoryQuerySet):
+    def normalize(self, objs, fields=None):
+        if fields is not None and "name" not in fields:
+            return []
+        for obj in objs:
+            obj.name = obj.name.upper()
+        return ["name"]
+
+    def normalize_values(self, values):
+        if isinstance(values.get("name"), str):
+            values["name"] = values["name"].upper()
+        return values
+
+
+class SubscriberQuerySet(DirectoryQuerySet):
+    # Renames purge the old details page, images are reference counted
+    row_fields = ("username", *IMAGE_FIELDS)
+
+    # Columns rendered by partials/table.html plus the keyset ordering keys
+    LISTING_FIELDS = (
+        "id",
+        "username",
+        "logo",
+        "active",
+        "company__id",
+        "company__name",
+        "company__tel1",
+        "company__uf",
+        "company__document",
+        "company__categoria1__id",
+        "company__categoria1__name",
+    )
+
+    def for_listing(self):
+        return self.select_related("company", "company__categoria1").only(
+            *self.LISTING_FIELDS
+        )
+
+    def normalize(self, objs, fields=None):
+        if fields is None or "username" in fields:
+            for obj in objs:
+                obj.username = obj.username.lower()
+        keys = [key for key in IMAGE_FIELDS if fields is None or key in fields]
+        if not keys and "username" not in fields:
+            return []
+
+        # One query for the stored rows, shared by every image field
+        pks = [obj.pk for obj in objs if obj.pk]
+        previous = {}
+        if pks:
+            previous = (
+                self.model._base_manager.using(self.db)
+                .only("username", *IMAGE_FIELDS)
+                .in_bulk(pks)
+            )
+
+        renamed = []
+        for obj in objs:
+            stored = previous.get(obj.pk)
+            obsolete = []
+            for key in keys:
+                set_key(obj, key, stored, obsolete)
+            before = []
+            if stored is not None:
+                before = [getattr(stored, key).name for key in keys]
+                if stored.username != obj.username:
+                    renamed.append(stored.username)
+            # Counted by update_media once the row is written
+            obj._media_change = (
+                before,
+                [getattr(obj, key).name for key in keys],
+                obsolete,
+            )
+
+        if renamed:
+            purge_pages(*(f"details:{username}" for username in renamed))
+        return []
+
+    def update_media(self, objs):
+        """
+        Count the blob references ``normalize`` found changed, once the
+        rows are written, and delete the files no row uses on commit.
+        """
+        before, after, obsolete = [], [], []
+        for obj in objs:
+            change = obj.__dict__.pop("_media_change", None)
+            if change is not None:
+                before += change[0]
+                after += change[1]
+                obsolete += change[2]
+
+        # Shared blobs are unlinked only when no row references them
+        released = MediaBlob.objects.update_refs(after, before)
+        names = [
+            name
+            for field_file in obsolete
+            if not is_blob(field_file.name)
+            for name in file_names(field_file)
+        ]
+        names += [name for blob in released for name in stored_names(blob)]
+        storage = self.model._meta.get_field("logo").storage
+        delete_on_commit(names, storage, keep=lambda: kept(objs, released))
 
 
 # MODELS
@@ -98,7 +380,7 @@ class Base(models.Model):
         get_user_model(), verbose_name="Autor(a)", on_delete=models.PROTECT
     )
     createdAt = models.DateField("Data de criação", auto_now_add=True)
-    updatedAt = models.DateField("Data de atualização", auto_now=True)
+    updatedAt = models.DateTimeField("Data de atualização", auto_now=True)
     active = models.BooleanField("Ativo?", default=True)
 
     class Meta:
@@ -136,19 +418,37 @@ class Company(Base):
         null=True,
         related_name="category2_set",
     )
+    # Lowercase, accent-free "name razao" filled by set_uppercase. Prefix
+    # lookups for the terms a full-text index can't answer, see
+    # core/search/backends.py
+    search_key = models.CharField(
+        "Chave de busca",
+        max_length=141,
+        db_index=True,
+        editable=False,
+        blank=True,
+    )
+
+    objects = CompanyQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Entidade"
         verbose_name_plural = "Entidades"
+        # The listing's tel1 days seek on (tel1, company id)
+        indexes = [models.Index(fields=["tel1", "id"], name="company_tel1_id")]
 
-    def clean(self):
-        if self.is_cpf:
-            if len(self.document) != 11:
-                raise ValidationError("CPF precisa de 11 dígitos")
-        else:
-            if len(self.document) != 14:
-                raise ValidationError("CNPJ precisa de 14 dígitos")
+    def save(self, *args, **kwargs):
+        fields = kwargs.get("update_fields")
+        # set_uppercase recomputes search_key from both
+        if fields is not None and {"name", "razao"} & set(fields):
+            kwargs["update_fields"] = {*fields, "search_key"}
+        super().save(*args, **kwargs)
 
+    def clean(self):
+        # Check digits are left to audits, stored rows predate them
+        validate_one(
+            document_errors, self.document, self.is_cpf, checksum=False
+        )
         super().clean()
 
     def __str__(self):
@@ -175,41 +475,53 @@ class Subscriber(Base):
         max_length=30,
         unique=True,
     )
-    logo = JPEGField(
+    logo = ResponsiveImageField(
         upload_to="logos/",
-        delete_orphans=True,
+        variations=LOGO_VARIATIONS,
         help_text="Max size 200KB",
     )
-    photo1 = JPEGField(
+    photo1 = ResponsiveImageField(
         upload_to="photos/",
-        delete_orphans=True,
+        variations=PHOTO_VARIATIONS,
         blank=True,
         help_text="Max size 500KB",
     )
-    photo2 = JPEGField(
+    photo2 = ResponsiveImageField(
         upload_to="photos/",
-        delete_orphans=True,
+        variations=PHOTO_VARIATIONS,
         blank=True,
         help_text="Max size 500KB",
     )
-    photo3 = JPEGField(
+    photo3 = ResponsiveImageField(
         upload_to="photos/",
-        delete_orphans=True,
+        variations=PHOTO_VARIATIONS,
         blank=True,
         help_text="Max size 500KB",
     )
-    photo4 = JPEGField(
+    photo4 = ResponsiveImageField(
         upload_to="photos/",
-        delete_orphans=True,
+        variations=PHOTO_VARIATIONS,
         blank=True,
         help_text="Max size 500KB",
     )
 
     obs = models.CharField("Observações", max_length=120, blank=True)
 
+    objects = SubscriberQuerySet.as_manager()
+
     def __str__(self):
         return f"Assinante {self.company.name[:30]}"
 
+    # The media receivers schedule file deletions with on_commit, which
+    # runs at once in autocommit: tie them to the write itself
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get("using")):
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get("using")):
+            return super().delete(*args, **kwargs)
+
     class Meta:
         verbose_name = "Assinante"
         verbose_name_plural = "Assinantes"
@@ -218,6 +530,8 @@ class Subscriber(Base):
 class Category(Base):
     name = models.CharField("Nome", max_length=20, unique=True)
 
+    objects = CategoryQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Categoria"
         verbose_name_plural = "Categorias"
@@ -226,21 +540,242 @@ class Category(Base):
         return self.name
 
 
+class ImageJob(models.Model):
+    """Pending variation rendering of an uploaded image (core/jobs.py)."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    FAILED = "failed"
+    STATUS_CHOICES = (
+        (PENDING, "Pendente"),
+        (RUNNING, "Em execução"),
+        (FAILED, "Falhou"),
+    )
+
+    # "app_label.Model.field", as in stdimage's rendervariations command
+    field = models.CharField("Campo", max_length=100)
+    file_name = models.CharField("Arquivo", max_length=255)
+    status = models.CharField(
+        "Status",
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        db_index=True,
+    )
+    error = models.TextField("Erro", blank=True)
+    createdAt = models.DateTimeField("Data de criação", auto_now_add=True)
+    updatedAt = models.DateTimeField("Data de atualização", auto_now=True)
+
+    class Meta:
+        verbose_name = "Processamento de imagem"
+        verbose_name_plural = "Processamentos de imagem"
+
+    def __str__(self):
+        return f"{self.field}: {self.file_name}"
+
+    def get_field(self):
+        app_label, model_name, field_name = self.field.split(".")
+        model = apps.get_model(app_label, model_name)
+        return model._meta.get_field(field_name)
+
+
+class MediaBlobManager(models.Manager):
+    def update_refs(self, added=(), removed=()):
+        """
+        Count the references to content-addressed files gained and lost
+        by a save and return the names no row references any more.
+        """
+        delta = Counter(name for name in added if is_blob(name))
+        delta.subtract(name for name in removed if is_blob(name))
+
+        released = []
+        for name, count in delta.items():
+            if count > 0:
+                self.get_or_create(name=name)
+            if count:
+                self.filter(name=name).update(refs=models.F("refs") + count)
+            if count < 0 and self.filter(name=name, refs__lte=0).delete()[0]:
+                released.append(name)
+        return released
+
+    def referenced(self, names):
+        return set(self.filter(name__in=names).values_list("name", flat=True))
+
+
+class MediaBlob(models.Model):
+    """A stored upload shared by every image field with the same content."""
+
+    name = models.CharField("Arquivo", max_length=100, unique=True)
+    refs = models.IntegerField("Referências", default=0)
+    createdAt = models.DateTimeField("Data de criação", auto_now_add=True)
+
+    objects = MediaBlobManager()
+
+    class Meta:
+        verbose_name = "Arquivo de mídia"
+        verbose_name_plural = "Arquivos de mídia"
+
+    def __str__(self):
+        return self.name
+
+
 # SIGNALS
+def indexing():
+    """Whether writes must keep the n-gram search index current."""
+    return uses_ngram_index() and search_index.ready
+
+
 @receiver(pre_save, sender=Company)
 @receiver(pre_save, sender=Category)
 def set_uppercase(sender, instance, **kwargs):
-    instance.name = instance.name.upper()
+    sender.objects.normalize([instance])
 
-    if hasattr(instance, "razao"):
-        instance.razao = instance.razao.upper()
+    if sender is Company and indexing():
+        for pk in Subscriber.objects.filter(company=instance.pk).values_list(
+            "pk", flat=True
+        ):
+            search_index.add(pk, instance.name, instance.razao)
 
 
 @receiver(pre_save, sender=Subscriber)
 def set_pathfile(sender, instance, **kwargs):
-    instance.username = instance.username.lower()
-    set_key(instance, "logo", Subscriber)
-    for i in range(4):
-        photo_key = "photo" + str(i + 1)
-        if bool(getattr(instance, photo_key)):
-            set_key(instance, photo_key, Subscriber)
+    Subscriber.objects.normalize([instance])
+
+
+@receiver(post_save, sender=Subscriber)
+def update_media(sender, instance, **kwargs):
+    # In the atomic block of Subscriber.save, after the row is written
+    Subscriber.objects.update_media([instance])
+
+
+@receiver(post_delete, sender=Subscriber)
+def release_media(sender, instance, **kwargs):
+    removed = [getattr(instance, key).name for key in IMAGE_FIELDS]
+    released = MediaBlob.objects.update_refs(removed=removed)
+    names = [name for blob in released for name in stored_names(blob)]
+    delete_on_commit(
+        names, instance.logo.storage, keep=lambda: kept((), released)
+    )
+
+
+def stored_names(name):
+    """
+    A stored image, the variations any image field renders of it and the
+    .webp sibling ``reencode_media --webp`` writes.
+    """
+    names = {name, os.path.splitext(name)[0] + ".webp"}
+    for key in IMAGE_FIELDS:
+        field = Subscriber._meta.get_field(key)
+        names.update(
+            field.attr_class.get_variation_name(name, variation)
+            for variation in field.variations
+        )
+    return names
+
+
+def kept(instances, released=()):
+    """
+    Files, with their variations, still referenced once the save commits:
+    the subscribers' own and the ``released`` blobs another row took up.
+    """
+    names = set()
+    for instance in instances:
+        for key in IMAGE_FIELDS:
+            field_file = getattr(instance, key)
+            if field_file:
+                names.update(file_names(field_file))
+    for name in MediaBlob.objects.referenced(released):
+        names.update(stored_names(name))
+    return names
+
+
+@receiver(post_save, sender=Subscriber)
+def index_subscriber(sender, instance, **kwargs):
+    # Runs after the save because new subscribers get their pk from the db
+    if indexing():
+        company = instance.company
+        search_index.add(instance.pk, company.name, company.razao)
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_save, sender=Subscriber)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Company)
+@receiver(post_delete, sender=Subscriber)
+@receiver(post_delete, sender=Category)
+def clear_search_cache(sender, instance, **kwargs):
+    invalidate_search()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def clear_categories_cache(sender, instance, **kwargs):
+    invalidate_categories()
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_save, sender=Subscriber)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Company)
+@receiver(post_delete, sender=Subscriber)
+def purge_page_cache(sender, instance, **kwargs):
+    # Listing pages show every row; details only the affected subscribers
+    if sender is Subscriber:
+        usernames = [instance.username]
+    else:
+        subscribers = affected_subscribers(sender, [instance.pk])
+        usernames = subscribers.values_list("username", flat=True)
+
+    purge_pages("subs", "search", *(f"details:{u}" for u in usernames))
+
+
+@receiver(pre_delete, sender=Category)
+def release_category(sender, instance, **kwargs):
+    # By post_delete the collector has cleared categoria2, without touching
+    # the updatedAt the details ETag is built from
+    Company._base_manager.filter(categoria2=instance).update(
+        updatedAt=timezone.now()
+    )
+    purge_page_cache(sender, instance)
+
+
+@receiver(directory_changed)
+def refresh_directory(sender, pks, **kwargs):
+    invalidate_search()
+    if sender is Category:
+        invalidate_categories()
+    if pks is None:
+        # Rows inserted without their pks can't have cached details yet
+        purge_pages("subs", "search")
+        if indexing():
+            search_index.build_from_db()
+        return
+
+    subscribers = affected_subscribers(sender, pks)
+    usernames = subscribers.values_list("username", flat=True)
+    purge_pages("subs", "search", *(f"details:{u}" for u in usernames))
+    if sender is not Category and indexing():
+        rows = subscribers.values_list("pk", "company__name", "company__razao")
+        for pk, *texts in rows:
+            search_index.add(pk, *texts)
+
+
+def affected_subscribers(sender, pks):
+    """The subscribers shown with the ``sender`` rows."""
+    if sender is Subscriber:
+        subscribers = Subscriber.objects.filter(pk__in=pks)
+    elif sender is Company:
+        subscribers = Subscriber.objects.filter(company__in=pks)
+    else:
+        subscribers = Subscriber.objects.filter(
+            models.Q(company__categoria1__in=pks)
+            | models.Q(company__categoria2__in=pks)
+        )
+    return subscribers
+
+
+@receiver(m2m_changed, sender=get_user_model().groups.through)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def clear_groups_cache(sender, **kwargs):
+    invalidate_groups()
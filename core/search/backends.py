@@ -0,0 +1,262 @@
+import re
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import FloatField, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from ..utils.index import normalize
+from .ngram import get_index
+
+
+def tokenize(term):
+    return re.findall(r"\w+", normalize(term))
+
+
+class SearchBackend:
+    """
+    Filter a Subscriber queryset by a free-text term and annotate it with
+    ``rank`` (higher is more relevant) for the view to order by.
+
+    Subclasses provide ``match_sql``, selecting the matching company ids,
+    and ``rank_sql``, the relevance of ``core_subscriber.company_id``.
+    Both receive the output of ``build_query`` as their only parameter.
+    """
+
+    match_sql = None
+    rank_sql = None
+
+    def build_query(self, term):
+        raise NotImplementedError
+
+    def search(self, queryset, term):
+        query = self.build_query(term)
+        if not query:
+            # Nothing the full-text index can match, punctuation or words
+            # it doesn't index: match the start of the name instead
+            return PrefixBackend().search(queryset, term)
+
+        return queryset.filter(
+            company__in=RawSQL(self.match_sql, [query])
+        ).annotate(rank=RawSQL(self.rank_sql, [query], FloatField()))
+
+    @classmethod
+    def install(cls, connection):
+        """Create the indexes the backend relies on. Must be idempotent."""
+
+    @classmethod
+    def uninstall(cls, connection):
+        pass
+
+
+class PrefixBackend(SearchBackend):
+    """
+    Index-served ``search_key LIKE 'term%'``: matches the beginning of the
+    normalized name the same way on every database.
+    """
+
+    def search(self, queryset, term):
+        return queryset.filter(
+            company__search_key__startswith=normalize(term)
+        ).annotate(rank=Value(0.0, FloatField()))
+
+
+class NgramBackend(PrefixBackend):
+    """Substring search through the in-process n-gram index."""
+
+    def search(self, queryset, term):
+        ids = get_index().search(term)
+        if ids is None:
+            # Too short for the n-gram index
+            return super().search(queryset, term)
+        return queryset.filter(pk__in=ids).annotate(
+            rank=Value(0.0, FloatField())
+        )
+
+
+class MySQLFulltextBackend(SearchBackend):
+    # InnoDB leaves out words shorter than innodb_ft_min_token_size and
+    # those of INNODB_FT_DEFAULT_STOPWORD. Required in the query, they
+    # would only match longer indexed words starting with them.
+    min_token_size = 3
+    stopwords = frozenset(
+        "a about an are as at be by com de en for from how i in is it la "
+        "of on or that the this to was what when where who will with und "
+        "www".split()
+    )
+    match_sql = (
+        "SELECT id FROM core_company "
+        "WHERE MATCH (name, razao) AGAINST (%s IN BOOLEAN MODE)"
+    )
+    rank_sql = (
+        "SELECT MATCH (name, razao) AGAINST (%s IN BOOLEAN MODE) "
+        "FROM core_company WHERE id = core_subscriber.company_id"
+    )
+
+    def build_query(self, term):
+        """
+        Every indexed word is required and may be a prefix.
+
+        >>> MySQLFulltextBackend().build_query("Padaria da Ana")
+        '+padaria* +ana*'
+        """
+        return " ".join(
+            f"+{token}*"
+            for token in tokenize(term)
+            if len(token) >= self.min_token_size
+            and token not in self.stopwords
+        )
+
+    @classmethod
+    def install(cls, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) FROM information_schema.statistics "
+                "WHERE table_schema = DATABASE() "
+                "AND table_name = 'core_company' "
+                "AND index_name = 'core_company_fulltext'"
+            )
+            if not cursor.fetchone()[0]:
+                cursor.execute(
+                    "ALTER TABLE core_company "
+                    "ADD FULLTEXT INDEX core_company_fulltext (name, razao)"
+                )
+
+    @classmethod
+    def uninstall(cls, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "ALTER TABLE core_company DROP INDEX core_company_fulltext"
+            )
+
+
+class PostgresBackend(SearchBackend):
+    # The 'simple' config keeps accents, strip them like normalize() does
+    document_sql = (
+        "to_tsvector('simple', translate(lower(name || ' ' || razao), "
+        "'áàâãäéèêëíìîïóòôõöúùûüçñ', 'aaaaaeeeeiiiiooooouuuucn'))"
+    )
+    match_sql = (
+        f"SELECT id FROM core_company "
+        f"WHERE {document_sql} @@ to_tsquery('simple', %s)"
+    )
+    # ts_rank is a float4, which the keyset cursor would compare against
+    # the double the page ended on and skip or repeat rows
+    rank_sql = (
+        f"SELECT ts_rank({document_sql}, to_tsquery('simple', %s))::float8 "
+        f"FROM core_company WHERE id = core_subscriber.company_id"
+    )
+
+    def build_query(self, term):
+        return " & ".join(f"{token}:*" for token in tokenize(term))
+
+    @classmethod
+    def install(cls, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS core_company_tsv "
+                f"ON core_company USING gin (({cls.document_sql}))"
+            )
+
+    @classmethod
+    def uninstall(cls, connection):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP INDEX IF EXISTS core_company_tsv")
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """
+    FTS5 table fed by triggers on core_company. SQLite drops triggers when
+    a migration rebuilds the table, so ``install`` also runs after every
+    ``migrate`` and repopulates the index when they are missing.
+    """
+
+    match_sql = (
+        "SELECT company_id FROM core_company_fts "
+        "WHERE core_company_fts MATCH %s"
+    )
+    rank_sql = (
+        "SELECT -bm25(core_company_fts) FROM core_company_fts "
+        "WHERE core_company_fts MATCH %s "
+        "AND company_id = core_subscriber.company_id"
+    )
+    triggers = {
+        "core_company_fts_ai": (
+            "AFTER INSERT ON core_company BEGIN "
+            "INSERT INTO core_company_fts (company_id, name, razao) "
+            "VALUES (new.id, new.name, new.razao); END"
+        ),
+        "core_company_fts_ad": (
+            "AFTER DELETE ON core_company BEGIN "
+            "DELETE FROM core_company_fts WHERE company_id = old.id; END"
+        ),
+        "core_company_fts_au": (
+            "AFTER UPDATE ON core_company BEGIN "
+            "DELETE FROM core_company_fts WHERE company_id = old.id; "
+            "INSERT INTO core_company_fts (company_id, name, razao) "
+            "VALUES (new.id, new.name, new.razao); END"
+        ),
+    }
+
+    def build_query(self, term):
+        return " ".join(f'"{token}"*' for token in tokenize(term))
+
+    @classmethod
+    def install(cls, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS core_company_fts "
+                "USING fts5(company_id UNINDEXED, name, razao, "
+                "tokenize = 'unicode61 remove_diacritics 2')"
+            )
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+                "AND tbl_name = 'core_company'"
+            )
+            existing = {row[0] for row in cursor.fetchall()}
+            if existing.issuperset(cls.triggers):
+                return
+
+            for name, body in cls.triggers.items():
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+                cursor.execute(f"CREATE TRIGGER {name} {body}")
+            cursor.execute("DELETE FROM core_company_fts")
+            cursor.execute(
+                "INSERT INTO core_company_fts (company_id, name, razao) "
+                "SELECT id, name, razao FROM core_company"
+            )
+
+    @classmethod
+    def uninstall(cls, connection):
+        with connection.cursor() as cursor:
+            for name in cls.triggers:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            cursor.execute("DROP TABLE IF EXISTS core_company_fts")
+
+
+VENDOR_BACKENDS = {
+    "mysql": MySQLFulltextBackend,
+    "postgresql": PostgresBackend,
+    "sqlite": SQLiteFTS5Backend,
+}
+
+
+def get_backend_class(vendor):
+    path = getattr(settings, "SEARCH_BACKEND", None)
+    if path:
+        return import_string(path)
+    return VENDOR_BACKENDS.get(vendor, NgramBackend)
+
+
+def get_backend():
+    return get_backend_class(connection.vendor)()
+
+
+def uses_ngram_index():
+    """Whether searches go through the in-process n-gram index."""
+    return issubclass(get_backend_class(connection.vendor), NgramBackend)
+
+
+def install_search_backend(sender, using, **kwargs):
+    conn = connections[using]
+    if conn.vendor == "sqlite":
+        get_backend_class(conn.vendor).install(conn)
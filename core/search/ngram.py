@@ -0,0 +1,121 @@
+import os
+import pickle
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from ..utils.index import normalize
+
+
+class NgramIndex:
+    """
+    In-memory inverted index of company ``name``/``razao`` n-grams to
+    subscriber ids. A substring search intersects the postings of the
+    term n-grams and confirms the hits against the indexed text, so the
+    database only receives ``pk IN (...)`` instead of ``LIKE '%term%'``.
+    """
+
+    def __init__(self, n=3):
+        self.n = n
+        self.postings = defaultdict(set)
+        self.documents = {}
+        self.built_at = None
+        self.lock = threading.RLock()
+
+    @property
+    def ready(self):
+        if self.built_at is None:
+            return False
+        max_age = getattr(settings, "SEARCH_INDEX_MAX_AGE", None)
+        return max_age is None or time.time() - self.built_at < max_age
+
+    def grams(self, text):
+        n = self.n
+        return {text[i : i + n] for i in range(len(text) - n + 1)}  # noqa
+
+    def add(self, pk, *texts):
+        # Fields are joined by a newline so no gram spans name and razao
+        text = "\n".join(normalize(t) for t in texts)
+        with self.lock:
+            self.remove(pk)
+            self.documents[pk] = text
+            for gram in self.grams(text):
+                self.postings[gram].add(pk)
+
+    def remove(self, pk):
+        with self.lock:
+            text = self.documents.pop(pk, None)
+            if text is None:
+                return
+            for gram in self.grams(text):
+                ids = self.postings.get(gram)
+                if ids is not None:
+                    ids.discard(pk)
+                    if not ids:
+                        del self.postings[gram]
+
+    def search(self, term):
+        """
+        Return the ids whose text contains ``term`` or ``None`` when the
+        term is shorter than ``n`` and can't be answered by the index.
+        """
+        term = normalize(term)
+        if len(term) < self.n:
+            return None
+
+        with self.lock:
+            postings = [self.postings.get(g, ()) for g in self.grams(term)]
+            postings.sort(key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+            return {pk for pk in candidates if term in self.documents[pk]}
+
+    def build(self, rows):
+        with self.lock:
+            self.postings = defaultdict(set)
+            self.documents = {}
+            for pk, *texts in rows:
+                self.add(pk, *texts)
+            self.built_at = time.time()
+
+    def build_from_db(self):
+        from ..models import Subscriber
+
+        rows = Subscriber.objects.values_list(
+            "pk", "company__name", "company__razao"
+        )
+        self.build(rows.iterator(chunk_size=2000))
+
+    def dump(self, path):
+        with self.lock:
+            state = (self.n, dict(self.postings), self.documents)
+            state += (self.built_at,)
+        with open(path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load(self, path):
+        with open(path, "rb") as f:
+            n, postings, documents, _ = pickle.load(f)
+        with self.lock:
+            self.n = n
+            self.postings = defaultdict(set, postings)
+            self.documents = documents
+            # Aged from the load, a snapshot older than MAX_AGE would
+            # otherwise be rebuilt by the first search request
+            self.built_at = time.time()
+
+
+search_index = NgramIndex()
+
+
+def load_snapshot():
+    path = getattr(settings, "SEARCH_INDEX_PATH", None)
+    if path and os.path.exists(path):
+        search_index.load(path)
+
+
+def get_index():
+    if not search_index.ready:
+        with search_index.lock:
+            if not search_index.ready:
+                search_index.build_from_db()
+    return search_index
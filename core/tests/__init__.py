@@ -1,4 +1,9 @@
+import os
 import random
+import shutil
+import tempfile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
 from model_bakery import baker
 
 docs = [
@@ -54,3 +59,27 @@ def gen_username():
 baker.generators.add("core.models.DocumentField", gen_cnpj)
 baker.generators.add("core.models.PhoneField", gen_phone)
 baker.generators.add("core.models.UsernameField", gen_username)
+
+
+IMGS_DIR = os.path.join(os.path.dirname(__file__), "imgs")
+
+
+def image_upload(name="logo.png"):
+    """``imgs/<name>`` as an uploaded file."""
+    with open(os.path.join(IMGS_DIR, name), "rb") as f:
+        return SimpleUploadedFile(name, f.read(), "image/png")
+
+
+class MediaRootMixin:
+    """Give each test an empty MEDIA_ROOT, removed afterwards."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        # Image variations are rendered in the test process
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, IMAGE_JOBS_WORKERS=0
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
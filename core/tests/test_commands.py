@@ -0,0 +1,386 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+import pytest
+from django.core.management import call_command
+from django.test import TestCase
+from model_bakery import baker
+from PIL import Image
+from . import IMGS_DIR, MediaRootMixin, image_upload
+
+from core.cache import search_generation
+from core.management.commands import import_companies
+from core.models import Company, ImageJob, Subscriber
+
+
+@pytest.mark.mo
+class ImageJobsTestCase(MediaRootMixin, TestCase):
+    def make_subscriber(self, image="logo.png"):
+        return baker.make_recipe(
+            "core.tests.subscriber_tekno", logo=image_upload(image)
+        )
+
+    def test_render_image_variations(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            sub = self.make_subscriber()
+        paths = [
+            getattr(sub.logo, name).path for name in sub.logo.field.variations
+        ]
+        for path in paths:
+            os.remove(path)
+
+        out = StringIO()
+        call_command("render_image_variations", stdout=out, stderr=out)
+
+        for path in paths:
+            self.assertTrue(os.path.exists(path), path)
+
+    def test_process_image_jobs(self):
+        with self.captureOnCommitCallbacks():
+            sub = self.make_subscriber("photo.png")
+        failed = ImageJob.objects.create(
+            field="core.Subscriber.photo1", file_name="missing.jpg"
+        )
+
+        out = StringIO()
+        call_command("process_image_jobs", workers=0, stdout=out)
+
+        self.assertTrue(os.path.exists(sub.logo.thumb_webp.path))
+        failed.refresh_from_db()
+        self.assertEqual(failed.status, ImageJob.FAILED)
+        self.assertIn("1 imagens processadas, 1 falharam", out.getvalue())
+
+
+@pytest.mark.mo
+class CleanOrphanedMediaTestCase(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sub = baker.make_recipe(
+                "core.tests.subscriber_tekno", logo=image_upload()
+            )
+
+        self.kept = [self.sub.logo.path, self.sub.logo.thumb_webp.path]
+        self.orphans = [
+            self.write("logos/1/acme-logo.jpg", age=2 * 60 * 60),
+            self.write("blobs/ff/ff00.thumb.jpeg", age=2 * 60 * 60),
+        ]
+        self.recent = self.write("photos/new.jpg", age=0)
+        for path in self.kept:
+            os.utime(path, (0, 0))
+
+    def write(self, name, age):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"jpeg")
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def clean(self, **options):
+        out = StringIO()
+        call_command("clean_orphaned_media", workers=2, stdout=out, **options)
+        return out.getvalue()
+
+    def test_dry_run(self):
+        output = self.clean(dry_run=True)
+
+        for path in self.orphans:
+            self.assertTrue(os.path.exists(path))
+            self.assertIn(os.path.relpath(path, self.media_root), output)
+        self.assertIn("2 órfãos a remover", output)
+        self.assertIn("1 recentes ignorados", output)
+
+    def test_deletes_orphans(self):
+        output = self.clean()
+
+        for path in self.orphans:
+            self.assertFalse(os.path.exists(path), path)
+        for path in self.kept + [self.recent]:
+            self.assertTrue(os.path.exists(path), path)
+        self.assertIn("2 órfãos removidos", output)
+
+
+@pytest.mark.mo
+class ReencodeMediaTestCase(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.checkpoint = os.path.join(self.media_root, "checkpoint")
+
+        # Older uploads were stored as sent, a PNG under a .jpg name
+        name = "logos/1/tekno-logo.jpg"
+        os.makedirs(os.path.join(self.media_root, "logos", "1"))
+        shutil.copy(
+            os.path.join(IMGS_DIR, "photo.png"),
+            os.path.join(self.media_root, name),
+        )
+        self.sub = baker.make_recipe("core.tests.subscriber_tekno", logo=name)
+        self.size = os.path.getsize(self.sub.logo.path)
+
+    def reencode(self, **options):
+        out = StringIO()
+        call_command(
+            "reencode_media",
+            workers=1,
+            checkpoint=self.checkpoint,
+            stdout=out,
+            **options,
+        )
+        return out.getvalue()
+
+    def test_reencode(self):
+        output = self.reencode(webp=True)
+
+        self.assertIn("1 imagens recodificadas", output)
+        self.assertLess(os.path.getsize(self.sub.logo.path), self.size)
+        with Image.open(self.sub.logo.path) as image:
+            self.assertEqual(image.format, "JPEG")
+            self.assertTrue(image.info.get("progressive"))
+            self.assertNotIn("exif", image.info)
+        webp_path = os.path.splitext(self.sub.logo.path)[0] + ".webp"
+        with Image.open(webp_path) as image:
+            self.assertEqual(image.format, "WEBP")
+
+    def test_resume_from_checkpoint(self):
+        self.reencode()
+        with open(self.checkpoint) as f:
+            self.assertEqual(f.read().split(), [self.sub.logo.path])
+
+        self.assertIn("0 imagens recodificadas", self.reencode())
+        self.assertIn("1 imagens recodificadas", self.reencode(restart=True))
+
+    def test_skips_blobs(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            sub = baker.make_recipe(
+                "core.tests.subscriber_view", logo=image_upload("photo.png")
+            )
+        with open(sub.logo.path, "rb") as f:
+            content = f.read()
+
+        self.assertIn("1 imagens recodificadas", self.reencode(webp=True))
+        with open(sub.logo.path, "rb") as f:
+            self.assertEqual(f.read(), content)
+
+    def test_cleanup_keeps_webp(self):
+        self.reencode(webp=True)
+        webp_path = os.path.splitext(self.sub.logo.path)[0] + ".webp"
+        os.utime(webp_path, (0, 0))
+
+        call_command("clean_orphaned_media", stdout=StringIO())
+        self.assertTrue(os.path.exists(webp_path))
+
+
+@pytest.mark.mo
+class AuditDirectoryTestCase(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.report = os.path.join(self.media_root, "audit.json")
+
+        os.makedirs(os.path.join(self.media_root, "logos"))
+        with open(os.path.join(self.media_root, "logos", "ok.jpg"), "wb"):
+            pass
+        self.ok, self.bad = [
+            baker.make_recipe("core.tests.subscriber_view") for _ in range(2)
+        ]
+        Subscriber._base_manager.filter(pk=self.ok.pk).update(
+            logo="logos/ok.jpg"
+        )
+        # Legacy rows, saved without the validators or normalization
+        Subscriber._base_manager.filter(pk=self.bad.pk).update(
+            logo="logos/gone.jpg", username="1bad"
+        )
+        Company._base_manager.filter(pk=self.bad.company.pk).update(
+            tel1="123",
+            document="123",
+            razao=self.ok.company.razao.lower(),
+        )
+
+    def audit(self, **options):
+        out = StringIO()
+        call_command(
+            "audit_directory", report=self.report, stdout=out, **options
+        )
+        with open(self.report) as f:
+            return out.getvalue(), json.load(f)
+
+    def test_report(self):
+        output, report = self.audit(workers=0)
+
+        self.assertIn("2 entidades e 2 assinantes", output)
+        self.assertEqual(report["counts"], {"company": 2, "subscriber": 2})
+        ok, bad = str(self.ok.company.pk), str(self.bad.company.pk)
+        self.assertEqual(
+            sorted(
+                (p["model"], p["pk"], p["field"]) for p in report["problems"]
+            ),
+            sorted(
+                [
+                    ("company", bad, "document"),
+                    ("company", bad, "tel1"),
+                    ("company", bad, "razao"),
+                    ("company", ok, "razao"),
+                    ("subscriber", str(self.bad.pk), "logo"),
+                    ("subscriber", str(self.bad.pk), "username"),
+                ]
+            ),
+        )
+
+    def test_workers(self):
+        _, serial = self.audit(workers=0)
+        _, parallel = self.audit(workers=2, chunk_size=1)
+        self.assertEqual(parallel["problems"], serial["problems"])
+
+
+@pytest.mark.mo
+class ImportCompaniesTestCase(TestCase):
+    header = (
+        "name,razao,document,is_cpf,email,tel1,uf,cidade,categoria1,"
+        "username,in_charge"
+    )
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.user = baker.make("User", username="importer")
+        baker.make("Category", name="Padaria")
+        baker.make("Company", document="46211198000153")
+
+    def write(self, name, lines):
+        path = os.path.join(self.tmpdir, name)
+        with open(path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        return path
+
+    def run_import(self, path, **options):
+        out, err = StringIO(), StringIO()
+        call_command(
+            "import_companies",
+            path,
+            user="importer",
+            stdout=out,
+            stderr=err,
+            **options,
+        )
+        return out.getvalue(), err.getvalue()
+
+    def test_import_csv(self):
+        path = self.write(
+            "companies.csv",
+            [
+                self.header,
+                "Pão Doce,Pão Doce Ltda,99726674000135,0,a@b.com,"
+                "(85)988887777,CE,Fortaleza,padaria,Pao_Doce,Ana",
+                "Bad,Bad Ltda,07808028000107,0,a@b.com,"
+                "123,CE,Fortaleza,padaria,,",
+                "Dup,Dup Ltda,99726674000135,0,a@b.com,"
+                "(85)988887777,CE,Fortaleza,padaria,,",
+                "Cpf,Cpf Ltda,54408794000156,1,a@b.com,"
+                "(85)988887777,CE,Fortaleza,padaria,,",
+                "Old,Old Ltda,46211198000153,0,a@b.com,"
+                "(85)988887777,CE,Fortaleza,padaria,,",
+                "Nova,Nova Ltda,17858840000153,0,a@b.com,"
+                "(85)32221111,CE,Fortaleza,açougue,,",
+                "Loja,Loja Ltda,47858280000153,0,a@b.com,"
+                "(85)32221111,CE,Fortaleza,Padaria,,",
+            ],
+        )
+        report = os.path.join(self.tmpdir, "errors.csv")
+        generation = search_generation()
+
+        out, _ = self.run_import(path, batch_size=2, report=report)
+
+        self.assertIn("2 entidades importadas, 5 erros", out)
+        company = Company.objects.get(document="99726674000135")
+        self.assertEqual(company.name, "PÃO DOCE")
+        self.assertEqual(company.search_key, "pao doce pao doce ltda")
+        self.assertEqual(company.categoria1.name, "PADARIA")
+        self.assertEqual(company.user, self.user)
+        self.assertEqual(company.subscriber.username, "pao_doce")
+        self.assertTrue(Company.objects.filter(name="LOJA").exists())
+        self.assertNotEqual(search_generation(), generation)
+
+        with open(report) as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(
+            [(row[0], row[1]) for row in rows[1:]],
+            [
+                ("3", "tel1"),
+                ("4", "document"),
+                ("5", "__all__"),
+                ("6", "document"),
+                ("7", "categoria1"),
+            ],
+        )
+
+    def test_import_jsonl(self):
+        row = {
+            "name": "Acme",
+            "razao": "Acme Ltda",
+            "document": "95778399000142",
+            "email": "a@b.com",
+            "tel1": "(85)988887777",
+            "uf": "CE",
+            "cidade": "Fortaleza",
+            "categoria1": "padaria",
+        }
+        path = self.write(
+            "companies.jsonl",
+            [json.dumps(row), "{not json", "[1]", '"x"', "3"],
+        )
+
+        out, err = self.run_import(path)
+
+        self.assertIn("1 entidades importadas, 4 erros", out)
+        for line in range(2, 6):
+            self.assertIn(f"Linha {line}: __all__: Objeto JSON inválido.", err)
+        self.assertTrue(Company.objects.filter(razao="ACME LTDA").exists())
+
+    def test_integrity_error_retries_rows(self):
+        path = self.write(
+            "companies.csv",
+            [
+                self.header,
+                "Old,Old Ltda,46211198000153,0,a@b.com,"
+                "(85)988887777,CE,Fortaleza,padaria,,",
+                "Nova,Nova Ltda,17858840000153,0,a@b.com,"
+                "(85)32221111,CE,Fortaleza,padaria,nova_loja,Ana",
+            ],
+        )
+        report = os.path.join(self.tmpdir, "errors.csv")
+
+        # A duplicate only the database sees, like a concurrent import's
+        with mock.patch.object(
+            import_companies.Command, "check_unique", return_value=set()
+        ):
+            out, _ = self.run_import(path, report=report)
+
+        self.assertIn("1 entidades importadas, 1 erros", out)
+        self.assertEqual(
+            Subscriber.objects.get(username="nova_loja").company.razao,
+            "NOVA LTDA",
+        )
+        with open(report) as f:
+            rows = list(csv.reader(f))
+        self.assertEqual([row[:2] for row in rows[1:]], [["2", "__all__"]])
+
+    def test_report_written_on_failure(self):
+        path = self.write(
+            "companies.jsonl", ["{not json", json.dumps({"name": "Acme"})]
+        )
+        report = os.path.join(self.tmpdir, "errors.csv")
+
+        with mock.patch.object(
+            import_companies.Command, "build", side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                self.run_import(path, report=report)
+
+        with open(report) as f:
+            self.assertEqual(len(list(csv.reader(f))), 2)
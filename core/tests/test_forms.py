@@ -1,8 +1,11 @@
-from django.test import TestCase
+from django.core.files.uploadhandler import StopUpload
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
 from datetime import datetime
 from django.core.files.uploadedfile import SimpleUploadedFile
 from model_bakery import baker
 from core.forms import SubscriberForm
+from core.uploadhandler import SizeLimitUploadHandler
 import copy
 import pytest
 import os
@@ -176,3 +179,50 @@ class SubscriberFormTestCase(TestCase):
             f.errors["photo1"][0],
             "The image size exceeds the maximum allowed size of 500KB.",
         )
+
+
+@pytest.mark.fo
+class SizeLimitUploadHandlerTestCase(TestCase):
+    def setUp(self):
+        self.request = RequestFactory().post("/")
+        self.handler = SizeLimitUploadHandler(self.request)
+
+    def test_drops_file_over_limit(self):
+        self.handler.new_file("logo", "pic.png", "image/png", None)
+        chunk = b"x" * 100 * 1024
+        self.handler.receive_data_chunk(chunk, 0)
+        self.handler.receive_data_chunk(chunk, len(chunk))
+        with self.assertRaises(StopUpload) as cm:
+            self.handler.receive_data_chunk(b"x", 2 * len(chunk))
+        self.assertTrue(cm.exception.connection_reset)
+        self.assertEqual(self.request.upload_errors, {"logo": 200})
+
+    def test_ignores_other_fields(self):
+        self.handler.new_file("attachment", "a.pdf", "application/pdf", None)
+        chunk = b"x" * 1024 * 1024
+        self.assertEqual(self.handler.receive_data_chunk(chunk, 0), chunk)
+        self.assertFalse(hasattr(self.request, "upload_errors"))
+
+    def test_admin_reports_dropped_file(self):
+        self.client.force_login(
+            baker.make("User", is_staff=True, is_superuser=True)
+        )
+        company = baker.make("Company", document="54408794000157")
+        with open(os.path.join(BASE_DIR, "imgs", "big.png"), "rb") as big:
+            response = self.client.post(
+                reverse("admin:core_subscriber_add"),
+                {
+                    "company": company.pk,
+                    "in_charge": "Marty",
+                    "username": "marty_mcfly",
+                    "logo": big,
+                },
+            )
+
+        form = response.context["adminform"].form
+        self.assertNotIn("logo", response.wsgi_request.FILES)
+        self.assertEqual(
+            form.errors["logo"],
+            ["The image size exceeds the maximum allowed size of 200KB."],
+        )
+        self.assertEqual(form.data["username"], "marty_mcfly")
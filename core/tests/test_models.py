@@ -3,14 +3,33 @@ import pytest
 import os
 
 # from unittest import skip
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.utils.text import slugify
 from model_bakery import baker
 from django.core.exceptions import ValidationError
+from django.db import connection, transaction
 from django.db.utils import IntegrityError
-from . import phones, docs, usernames
-
-from core.models import PhoneField, DocumentField, UsernameField
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from . import MediaRootMixin, image_upload, phones, docs, usernames
+
+from core.cache import categories_version
+from core.search.ngram import get_index
+from core.validators import (
+    document_errors,
+    phone_errors,
+    username_errors,
+)
+from core.models import (
+    Category,
+    Company,
+    Subscriber,
+    PhoneField,
+    DocumentField,
+    UsernameField,
+    ImageJob,
+    MediaBlob,
+)
 
 
 @pytest.mark.mo
@@ -85,6 +104,47 @@ class DocumentFieldTestCase(TestCase):
                 self.field.clean(invalid_doc, None)
 
 
+@pytest.mark.mo
+class ValidatorsTestCase(TestCase):
+    def test_columns(self):
+        self.assertEqual(phone_errors(phones), {})
+        self.assertEqual(username_errors(usernames), {})
+        self.assertEqual(
+            list(username_errors(["_jane", "jan", "jane_doe"])), [0, 1]
+        )
+
+    def test_document_check_digits(self):
+        errors = document_errors(
+            [
+                "99726674000135",
+                "99726674000136",
+                "00000000000000",
+                "9972667400013a",
+                "52998224725",
+                "52998224724",
+            ],
+            [False, False, False, False, True, True],
+        )
+        self.assertEqual(
+            errors,
+            {
+                1: "CNPJ inválido.",
+                2: "CNPJ inválido.",
+                3: "Apenas dígitos numéricos.",
+                5: "CPF inválido.",
+            },
+        )
+
+    def test_document_length(self):
+        self.assertEqual(
+            document_errors(["52998224725", "123"], False, checksum=False),
+            {
+                0: "CNPJ precisa de 14 dígitos",
+                1: "CNPJ precisa de 14 dígitos",
+            },
+        )
+
+
 @pytest.mark.mo
 class CompanyTestCase(TestCase):
     def setUp(self):
@@ -107,6 +167,20 @@ class CompanyTestCase(TestCase):
             c2 = baker.make("Company", document="49726674000135", is_cpf=True)
             c2.clean()
 
+    def test_search_key(self):
+        c = baker.make(
+            "Company",
+            name="São João",
+            razao="Padaria São João Ltda.",
+            document="19826674000135",
+        )
+        self.assertEqual(c.search_key, "sao joao padaria sao joao ltda.")
+
+        c.name = "Café"
+        c.save(update_fields=["name"])
+        c.refresh_from_db()
+        self.assertEqual(c.search_key, "cafe padaria sao joao ltda.")
+
     def test_clean_method(self):
         try:
             c3 = baker.make("Company", document=self.cnpj)
@@ -155,8 +229,259 @@ class SubscriberTestCase(TestCase):
             self.assertEqual(str(photo_attr), pathname)
 
 
+@pytest.mark.mo
+class ImageVariationsTestCase(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sub = self.make_subscriber()
+
+    def make_subscriber(self, image="logo.png", **kwargs):
+        return baker.make_recipe(
+            "core.tests.subscriber_tekno", logo=image_upload(image), **kwargs
+        )
+
+    def make_other(self, image="logo.png"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.make_subscriber(
+                image,
+                username="jane_doe",
+                company=baker.make("Company", document="19536674000182"),
+            )
+
+    def variation_paths(self):
+        return [
+            getattr(self.sub.logo, name).path
+            for name in self.sub.logo.field.variations
+        ]
+
+    def test_variations_rendered_on_save(self):
+        self.assertRegex(
+            self.sub.logo.thumb.name, r"/[0-9a-f]{64}\.thumb\.jpeg$"
+        )
+        self.assertRegex(
+            self.sub.logo.thumb_webp.name, r"/[0-9a-f]{64}\.thumb_webp\.webp$"
+        )
+        for path in self.variation_paths():
+            self.assertTrue(os.path.exists(path), path)
+        self.assertFalse(ImageJob.objects.exists())
+
+        with Image.open(self.sub.logo.thumb_webp.path) as image:
+            self.assertEqual(image.format, "WEBP")
+            self.assertLessEqual(max(image.size), 100)
+
+    def test_content_hashed_name(self):
+        self.assertRegex(
+            self.sub.logo.name, r"^blobs/([0-9a-f]{2})/\1[0-9a-f]{62}\.jpg$"
+        )
+
+        old_name = self.sub.logo.name
+        self.sub.logo = image_upload("photo.png")
+        self.sub.save()
+        self.assertNotEqual(self.sub.logo.name, old_name)
+
+    def test_same_content_reuses_stored_file(self):
+        old_name = self.sub.logo.name
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sub.logo = image_upload("logo.png")
+            self.sub.save()
+
+        self.assertEqual(self.sub.logo.name, old_name)
+        stored = [self.sub.logo.path] + self.variation_paths()
+        self.assertCountEqual(
+            os.listdir(os.path.dirname(self.sub.logo.path)),
+            [os.path.basename(path) for path in stored],
+        )
+        self.assertFalse(ImageJob.objects.exists())
+
+    def test_shared_blob_is_stored_once(self):
+        other = self.make_other()
+
+        self.assertEqual(other.logo.name, self.sub.logo.name)
+        self.assertEqual(MediaBlob.objects.get().refs, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sub.logo = image_upload("photo.png")
+            self.sub.save()
+        self.assertTrue(os.path.exists(other.logo.path))
+        self.assertEqual(MediaBlob.objects.get(name=other.logo.name).refs, 1)
+
+        paths = [other.logo.path, other.logo.thumb.path]
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        for path in paths:
+            self.assertFalse(os.path.exists(path), path)
+        self.assertFalse(
+            MediaBlob.objects.filter(name=other.logo.name).exists()
+        )
+
+    def test_blob_shared_across_fields(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sub.photo1 = image_upload("logo.png")
+            self.sub.photo2 = image_upload("logo.png")
+            self.sub.save()
+
+        self.assertEqual(self.sub.photo1.name, self.sub.logo.name)
+        self.assertEqual(self.sub.photo2.name, self.sub.logo.name)
+        self.assertEqual(MediaBlob.objects.get().refs, 3)
+        # Rendered for the photo fields as well
+        self.assertTrue(os.path.exists(self.sub.photo1.mobile.path))
+        self.assertTrue(os.path.exists(self.sub.logo.thumb.path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sub.photo1 = self.sub.photo2 = ""
+            self.sub.save()
+        self.assertEqual(MediaBlob.objects.get().refs, 1)
+        self.assertTrue(os.path.exists(self.sub.logo.path))
+
+    def test_replace_loads_previous_row_once(self):
+        self.sub.logo = image_upload("photo.png")
+        self.sub.photo1 = image_upload("photo.png")
+        with CaptureQueriesContext(connection) as ctx:
+            self.sub.save()
+
+        selects = [
+            q["sql"]
+            for q in ctx.captured_queries
+            if q["sql"].startswith("SELECT") and "core_subscriber" in q["sql"]
+        ]
+        self.assertEqual(len(selects), 1)
+
+    def test_old_files_deleted_on_commit(self):
+        old = [self.sub.logo.path] + self.variation_paths()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.sub.logo = image_upload("photo.png")
+            self.sub.save()
+        for path in old:
+            self.assertTrue(os.path.exists(path), path)
+
+        for callback in callbacks:
+            callback()
+        for path in old:
+            self.assertFalse(os.path.exists(path), path)
+        self.assertTrue(os.path.exists(self.sub.logo.path))
+
+    def test_rollback_keeps_old_files(self):
+        old = self.sub.logo.path
+        with self.captureOnCommitCallbacks() as callbacks:
+            with self.assertRaises(IntegrityError):
+                with transaction.atomic():
+                    self.sub.logo = image_upload("photo.png")
+                    self.sub.save()
+                    raise IntegrityError
+
+        self.assertEqual(callbacks, [])
+        self.assertTrue(os.path.exists(old))
+
+    def test_failed_save_keeps_old_files(self):
+        other = self.make_other("photo.png")
+        old = [self.sub.logo.path] + self.variation_paths()
+        refs = dict(MediaBlob.objects.values_list("name", "refs"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(IntegrityError):
+                self.sub.logo = image_upload("photo.png")
+                self.sub.username = other.username
+                self.sub.save()
+
+        for path in old:
+            self.assertTrue(os.path.exists(path), path)
+        self.assertEqual(
+            dict(MediaBlob.objects.values_list("name", "refs")), refs
+        )
+
+    def test_refs_counted_after_the_write(self):
+        self.sub.logo = image_upload("photo.png")
+        Subscriber.objects.normalize([self.sub])
+        self.assertEqual(MediaBlob.objects.count(), 1)
+
+        Subscriber.objects.update_media([self.sub])
+        self.assertEqual(
+            MediaBlob.objects.get(name=self.sub.logo.name).refs, 1
+        )
+
+    def test_variations_deferred_until_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            sub = self.make_subscriber(
+                "photo.png",
+                username="jane_doe",
+                company=baker.make("Company", document="19536674000182"),
+            )
+
+        job = ImageJob.objects.get()
+        self.assertEqual(job.field, "core.Subscriber.logo")
+        self.assertEqual(job.file_name, sub.logo.name)
+        self.assertEqual(job.status, ImageJob.PENDING)
+        self.assertFalse(os.path.exists(sub.logo.thumb.path))
+
+        for callback in callbacks:
+            callback()
+
+        self.assertTrue(os.path.exists(sub.logo.thumb.path))
+        self.assertFalse(ImageJob.objects.exists())
+
+
 @pytest.mark.mo
 class CategoryTestCase(TestCase):
     def test_str(self):
         category = baker.make("Category")
         self.assertEqual(str(category), category.name)
+
+
+@pytest.mark.mo
+class BulkNormalizationTestCase(TestCase):
+    def setUp(self):
+        self.sub = baker.make_recipe("core.tests.subscriber_view")
+        self.company = self.sub.company
+
+    def test_bulk_create(self):
+        user = baker.make("User")
+        category = Category.objects.bulk_create(
+            [Category(user=user, name="padaria")]
+        )[0]
+        company = Company.objects.bulk_create(
+            [
+                baker.prepare(
+                    "Company",
+                    name="São João",
+                    razao="Padaria São João",
+                    document="19526674000135",
+                    categoria1=category,
+                    user=user,
+                )
+            ]
+        )[0]
+
+        company.refresh_from_db()
+        self.assertEqual(company.razao, "PADARIA SÃO JOÃO")
+        self.assertEqual(company.search_key, "sao joao padaria sao joao")
+        self.assertEqual(company.categoria1.name, "PADARIA")
+
+    @override_settings(SEARCH_BACKEND="core.search.backends.NgramBackend")
+    def test_update(self):
+        updated_at = self.company.updatedAt
+        get_index().build_from_db()
+        with CaptureQueriesContext(connection) as ctx:
+            Company.objects.filter(pk=self.company.pk).update(name="Café")
+
+        self.company.refresh_from_db()
+        self.assertEqual(self.company.name, "CAFÉ")
+        self.assertTrue(self.company.search_key.startswith("cafe "))
+        self.assertGreater(self.company.updatedAt, updated_at)
+        self.assertEqual(get_index().search("cafe"), {self.sub.pk})
+        updates = [q for q in ctx if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+
+    def test_bulk_update(self):
+        self.sub.username = "Mulan_Hua"
+        Subscriber.objects.bulk_update([self.sub], ["username"])
+        self.sub.refresh_from_db()
+        self.assertEqual(self.sub.username, "mulan_hua")
+
+        category = baker.make("Category", name="acougue")
+        version = categories_version()
+        Category.objects.filter(pk=category.pk).update(name="açougue")
+        category.refresh_from_db()
+        self.assertEqual(category.name, "AÇOUGUE")
+        self.assertNotEqual(categories_version(), version)
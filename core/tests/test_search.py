@@ -0,0 +1,209 @@
+import os
+import tempfile
+import pytest
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from model_bakery import baker
+
+from core.search.backends import MySQLFulltextBackend
+from core.search.ngram import NgramIndex, get_index
+
+
+@pytest.mark.se
+class NgramIndexTestCase(TestCase):
+    def setUp(self):
+        self.index = NgramIndex()
+        self.index.build(
+            [
+                (1, "SÃO JOÃO MATERIAIS", "SAO JOAO MATERIAIS LTDA"),
+                (2, "PADARIA JOÃO", "PANIFICADORA CENTRAL ME"),
+                (3, "GENESIS INFORMÁTICA", "GENESIS APPS LTDA"),
+            ]
+        )
+
+    def test_substring_search(self):
+        self.assertEqual(self.index.search("joão"), {1, 2})
+        self.assertEqual(self.index.search("materiais"), {1})
+
+    def test_accent_and_case_insensitive(self):
+        self.assertEqual(self.index.search("sao joao"), {1})
+        self.assertEqual(self.index.search("informatica"), {3})
+
+    def test_searches_razao(self):
+        self.assertEqual(self.index.search("panificadora"), {2})
+
+    def test_no_match_across_fields(self):
+        self.assertEqual(self.index.search("materiais sao"), set())
+
+    def test_short_term(self):
+        self.assertIsNone(self.index.search("jo"))
+
+    def test_update_and_remove(self):
+        self.index.add(2, "CONFEITARIA MARIA", "CONFEITARIA MARIA ME")
+        self.assertEqual(self.index.search("joão"), {1})
+        self.index.remove(1)
+        self.assertEqual(self.index.search("joão"), set())
+
+    def test_snapshot_roundtrip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "index.pickle")
+            self.index.dump(path)
+            loaded = NgramIndex()
+            loaded.load(path)
+        self.assertEqual(loaded.search("genesis"), {3})
+
+    @override_settings(SEARCH_INDEX_MAX_AGE=60)
+    def test_old_snapshot_is_ready(self):
+        self.index.built_at -= 3600
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "index.pickle")
+            self.index.dump(path)
+            loaded = NgramIndex()
+            loaded.load(path)
+        self.assertTrue(loaded.ready)
+
+
+@pytest.mark.se
+@override_settings(SEARCH_BACKEND="core.search.backends.NgramBackend")
+class SearchIndexSignalsTestCase(TestCase):
+    def setUp(self):
+        self.company = baker.make(
+            "Company", name="Loja Azul", document="57808028000101"
+        )
+        self.subscriber = baker.make(
+            "Subscriber", company=self.company, username="loja_azul"
+        )
+        self.index = get_index()
+
+    def test_company_rename_updates_index(self):
+        self.company.name = "Loja Verde"
+        self.company.save()
+        self.assertEqual(self.index.search("verde"), {self.subscriber.pk})
+        self.assertNotIn(self.subscriber.pk, self.index.search("azul"))
+
+    def test_new_subscriber_is_indexed(self):
+        company = baker.make(
+            "Company", name="Loja Amarela", document="57808028000102"
+        )
+        subscriber = baker.make(
+            "Subscriber", company=company, username="loja_amarela"
+        )
+        self.assertEqual(self.index.search("amarela"), {subscriber.pk})
+
+    @override_settings(SEARCH_BACKEND="core.search.backends.PrefixBackend")
+    def test_other_backends_skip_index(self):
+        self.company.name = "Loja Verde"
+        # The UPDATE and the usernames of the pages to purge, no index work
+        with self.assertNumQueries(2):
+            self.company.save()
+        self.assertEqual(self.index.search("verde"), set())
+
+
+@pytest.mark.se
+class SearchBackendTestCase(TestCase):
+    def setUp(self):
+        names = [
+            ("SÃO JOÃO MATERIAIS", "SAO JOAO MATERIAIS LTDA"),
+            ("PADARIA CENTRAL", "PADARIA SÃO JOÃO ME"),
+            ("GENESIS INFORMÁTICA", "GENESIS APPS LTDA"),
+        ]
+        self.subs = []
+        for i, (name, razao) in enumerate(names):
+            company = baker.make(
+                "Company",
+                name=name,
+                razao=razao,
+                document="3780802800010" + str(i),
+            )
+            self.subs.append(
+                baker.make(
+                    "Subscriber", company=company, username=f"search{i}"
+                )
+            )
+
+    def search(self, term):
+        response = self.client.get(
+            reverse("search"),
+            {"location": "n", "category": "t", "search_term": term},
+        )
+        return [sub.pk for sub in response.context["subs"]]
+
+    def test_accent_insensitive(self):
+        self.assertEqual(
+            set(self.search("sao joao")),
+            {self.subs[0].pk, self.subs[1].pk},
+        )
+
+    def test_prefix(self):
+        self.assertEqual(self.search("inform"), [self.subs[2].pk])
+
+    def test_ranked_by_relevance(self):
+        # Matches in both name and razao outrank a razao-only match
+        self.assertEqual(
+            self.search("joão"), [self.subs[0].pk, self.subs[1].pk]
+        )
+
+    def test_no_match(self):
+        self.assertEqual(self.search("farmácia"), [])
+
+    def test_no_words(self):
+        self.assertEqual(self.search("!!!"), [])
+
+    @override_settings(SEARCH_BACKEND="core.search.backends.NgramBackend")
+    def test_ngram_backend(self):
+        # The rows were written under the default backend, unindexed
+        get_index().build_from_db()
+        self.assertEqual(
+            set(self.search("são joão")),
+            {self.subs[0].pk, self.subs[1].pk},
+        )
+        self.assertEqual(self.search("formát"), [self.subs[2].pk])
+
+    @override_settings(SEARCH_BACKEND="core.search.backends.PrefixBackend")
+    def test_prefix_backend(self):
+        self.assertEqual(self.search("sao jo"), [self.subs[0].pk])
+        self.assertEqual(self.search("PADARIA"), [self.subs[1].pk])
+        self.assertEqual(self.search("materiais"), [])
+
+    def test_ranked_pages(self):
+        for i in range(15):
+            company = baker.make(
+                "Company",
+                name=f"GENESIS FILIAL {i}",
+                document="4780802800010" + str(i),
+            )
+            baker.make("Subscriber", company=company, username=f"filial{i}")
+
+        seen = []
+        params = {"location": "n", "category": "t", "search_term": "genesis"}
+        while True:
+            response = self.client.get(reverse("search"), params)
+            page = response.context["page_obj"]
+            seen += [sub.pk for sub in page]
+            if not page.has_next():
+                break
+            params["cursor"] = page.next_cursor
+
+        self.assertEqual(len(seen), 16)
+        self.assertEqual(len(set(seen)), 16)
+        self.assertEqual(seen[0], self.subs[2].pk)
+
+
+@pytest.mark.se
+class MySQLFulltextQueryTestCase(SimpleTestCase):
+    def setUp(self):
+        self.backend = MySQLFulltextBackend()
+
+    def test_required_prefixes(self):
+        self.assertEqual(self.backend.build_query("São João"), "+sao* +joao*")
+
+    def test_skips_unindexed_words(self):
+        # Below innodb_ft_min_token_size or an InnoDB stopword
+        self.assertEqual(
+            self.backend.build_query("padaria da ana de la e"),
+            "+padaria* +ana*",
+        )
+
+    def test_only_unindexed_words(self):
+        self.assertEqual(self.backend.build_query("da e"), "")
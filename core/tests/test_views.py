@@ -1,10 +1,56 @@
+import csv
+import io
+import json
+import os
+import uuid
 import pytest
 
 # from unittest import skip
-from django.test import TestCase
+from unittest import mock
+from django.contrib.auth.models import Permission
+from django.db import connection
+from django.conf import settings
+from django.core.cache import caches
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from model_bakery import baker
 
 from django.urls import reverse
+from core.models import Category, Company, Subscriber
+from core.views import SubscriberDetailView, TableView, serve_media
+from core.search.ngram import get_index
+from core.cache import (
+    CATEGORY_VERSION_KEY,
+    GROUPS_VERSION_KEY,
+    SEARCH_GENERATION_KEY,
+    get_categories,
+    in_group,
+    page_cache_key,
+    search_generation,
+)
+from core.cache_backends import TwoTierCache
+from . import MediaRootMixin
+
+# For tests that repeat a request and inspect what the view did
+no_page_cache = override_settings(
+    CACHES={
+        **settings.CACHES,
+        "pages": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+    }
+)
+
+# Page rows only, the search form is served from cache
+LISTING_QUERY_BUDGET = 1
+
+ORDERINGS = [
+    "company_id",
+    "-id",
+    "company__tel1",
+    "company__document",
+    "-company_id",
+    "-company__tel1",
+    "-company__document",
+]
 
 
 @pytest.mark.vi
@@ -170,3 +216,726 @@ class SubscriberViewTestCase(TestCase):
         self.assertEqual(self.company_name, name)
         self.assertEqual(self.company_category, category)
         self.assertEqual(self.sub_logo, logo)
+
+
+@pytest.mark.vi
+@no_page_cache
+class KeysetPaginationTestCase(TestCase):
+    def setUp(self):
+        self.subs = [
+            baker.make_recipe("core.tests.subscriber_view") for _ in range(23)
+        ]
+
+    def walk(self, cursor_attr):
+        seen = []
+        params = {}
+        if cursor_attr == "previous_cursor":
+            response = self.client.get(reverse("subs"))
+            params = {"cursor": response.context["page_obj"].last_cursor}
+        while True:
+            response = self.client.get(reverse("subs"), params)
+            page = response.context["page_obj"]
+            self.assertLessEqual(len(page), 10)
+            if cursor_attr == "previous_cursor":
+                seen = [sub.pk for sub in page] + seen
+            else:
+                seen += [sub.pk for sub in page]
+            cursor = getattr(page, cursor_attr)
+            if cursor is None:
+                return seen
+            params = {"cursor": cursor}
+
+    def test_forward_walk_covers_every_ordering(self):
+        expected = sorted(sub.pk for sub in self.subs)
+        for ordering in ORDERINGS:
+            with mock.patch.object(
+                TableView, "get_ordering", return_value=ordering
+            ):
+                seen = self.walk("next_cursor")
+                self.assertEqual(len(seen), len(set(seen)), ordering)
+                self.assertEqual(sorted(seen), expected, ordering)
+
+    def test_backward_walk_matches_forward_walk(self):
+        for ordering in ORDERINGS:
+            with mock.patch.object(
+                TableView, "get_ordering", return_value=ordering
+            ):
+                self.assertEqual(
+                    self.walk("previous_cursor"),
+                    self.walk("next_cursor"),
+                    ordering,
+                )
+
+    def test_stale_cursor_restarts(self):
+        with mock.patch.object(
+            TableView, "get_ordering", return_value="company__tel1"
+        ):
+            response = self.client.get(reverse("subs"))
+            cursor = response.context["page_obj"].next_cursor
+        with mock.patch.object(TableView, "get_ordering", return_value="-id"):
+            response = self.client.get(reverse("subs"), {"cursor": cursor})
+        self.assertFalse(response.context["page_obj"].has_previous())
+
+    def test_tiebreakers(self):
+        view = TableView()
+        view.model = Subscriber
+        for ordering, expected in [
+            ("company__tel1", ["company__tel1", "company_id"]),
+            ("-company__tel1", ["-company__tel1", "-company_id"]),
+            ("company__document", ["company__document"]),
+            ("-company_id", ["-company_id"]),
+            ("-id", ["-id"]),
+            (
+                ["-rank", "company__name"],
+                ["-rank", "company__name", "company_id"],
+            ),
+        ]:
+            with mock.patch.object(
+                TableView, "get_ordering", return_value=ordering
+            ):
+                self.assertEqual(view.get_keyset_ordering(), expected)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse("subs"), {"cursor": "%%%"})
+        self.assertEqual(response.status_code, 404)
+
+
+@pytest.mark.vi
+class ListingQueryBudgetTestCase(TestCase):
+    def setUp(self):
+        category = baker.make("Category", name="GAME")
+        for i in range(12):
+            company = baker.make(
+                "Company",
+                name="PAULA FERNANDES",
+                document="2780802800010" + str(i),
+                categoria1=category,
+                categoria2=category,
+                uf="PA",
+            )
+            baker.make("Subscriber", company=company, username=f"fernandes{i}")
+        # Warm the n-gram index and the category snapshot
+        get_index()
+        get_categories()
+
+    def assertWithinBudget(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+            html = response.content.decode()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("PAULA FERNANDES", html)
+        self.assertLessEqual(len(queries), LISTING_QUERY_BUDGET)
+        return queries
+
+    def test_list_query_budget(self):
+        self.assertWithinBudget(reverse("subs"))
+
+    def test_search_query_budget(self):
+        self.assertWithinBudget(
+            reverse("search"),
+            {"location": "PA", "category": "t", "search_term": "PAULA"},
+        )
+
+    def test_listing_skips_wide_columns(self):
+        queries = self.assertWithinBudget(reverse("subs"))
+        rows_sql = queries.captured_queries[0]["sql"]
+        self.assertNotIn('"desc"', rows_sql)
+        self.assertNotIn('"iframe"', rows_sql)
+
+
+@pytest.mark.vi
+@no_page_cache
+class SearchCacheTestCase(TestCase):
+    def setUp(self):
+        self.category = baker.make("Category", name="PADARIA")
+        self.params = {
+            "location": "CE",
+            "category": self.category.pk,
+            "search_term": "São João",
+        }
+        self.sub = self.make_subscriber(0)
+
+    def make_subscriber(self, i):
+        company = baker.make(
+            "Company",
+            name=f"PADARIA SÃO JOÃO {i}",
+            document="5780802800010" + str(i),
+            categoria1=self.category,
+            uf="CE",
+        )
+        return baker.make("Subscriber", company=company, username=f"sjoao{i}")
+
+    def search(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("search"), {**self.params, **params}
+            )
+        subs = [sub.pk for sub in response.context["subs"]]
+        return subs, [q["sql"] for q in queries.captured_queries]
+
+    def test_repeated_search_skips_search_query(self):
+        subs, first = self.search()
+        cached_subs, second = self.search()
+        self.assertEqual(cached_subs, subs)
+        self.assertTrue(any("core_company_fts" in sql for sql in first))
+        self.assertFalse(any("core_company_fts" in sql for sql in second))
+
+    def test_normalized_term_shares_entry(self):
+        self.search()
+        subs, queries = self.search(search_term="  sao joao ")
+        self.assertEqual(subs, [self.sub.pk])
+        self.assertFalse(any("core_company_fts" in sql for sql in queries))
+
+    def test_invalidated_by_writes(self):
+        self.search()
+        new_sub = self.make_subscriber(1)
+        subs, _ = self.search()
+        self.assertEqual(set(subs), {self.sub.pk, new_sub.pk})
+
+        new_sub.active = False
+        new_sub.save()
+        subs, _ = self.search()
+        self.assertEqual(subs, [self.sub.pk])
+
+        self.sub.company.uf = "BA"
+        self.sub.company.save()
+        subs, _ = self.search()
+        self.assertEqual(subs, [])
+
+    def test_invalidated_by_other_workers(self):
+        self.search()
+        # Another worker's invalidate_search(), in the shared tier only
+        caches["search"].shared.set(SEARCH_GENERATION_KEY, "other", None)
+        self.assertEqual(search_generation(), "other")
+
+
+@pytest.mark.vi
+@no_page_cache
+class SearchFormCacheTestCase(TestCase):
+    def setUp(self):
+        self.category = baker.make("Category", name="GAME")
+
+    def test_form_costs_no_queries(self):
+        self.client.get(reverse("subs"))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("subs"))
+        self.assertEqual(len(queries), 1)
+        self.assertContains(response, f"<option value={self.category.pk}>")
+
+    def test_category_changes_refresh_form(self):
+        self.client.get(reverse("subs"))
+        self.category.name = "GAMES"
+        self.category.save()
+        book = baker.make("Category", name="BOOK")
+        response = self.client.get(reverse("subs"))
+        self.assertContains(response, ">GAMES</option>")
+        self.assertContains(response, ">BOOK</option>")
+
+        book.delete()
+        response = self.client.get(reverse("search"), {"location": "n"})
+        self.assertNotContains(response, ">BOOK</option>")
+
+    def test_refreshed_by_other_workers(self):
+        self.client.get(reverse("subs"))
+        # Another worker's save, its version bump in the shared tier only
+        Category._base_manager.filter(pk=self.category.pk).update(name="PC")
+        caches["default"].shared.set(CATEGORY_VERSION_KEY, "other", None)
+
+        response = self.client.get(reverse("subs"))
+        self.assertContains(response, ">PC</option>")
+
+    def test_version_bumped_again_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.category.name = "GAMES"
+            self.category.save()
+        # What a reader could load before the commit
+        version, _ = get_categories()
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_categories()[0], version)
+
+
+@pytest.mark.vi
+class SubscriberConditionalGetTestCase(TestCase):
+    def setUp(self):
+        self.sub = baker.make_recipe("core.tests.subscriber_view")
+        self.url = reverse("details", kwargs={"username": self.sub.username})
+
+    def test_validators(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header("ETag"))
+        self.assertTrue(response.has_header("Last-Modified"))
+
+    def test_single_lookup(self):
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+
+    def test_if_none_match(self):
+        etag = self.client.get(self.url).headers["ETag"]
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIsNone(response.context)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get(self.url).headers["Last-Modified"]
+        response = self.client.get(
+            self.url, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_company_change_invalidates_etag(self):
+        etag = self.client.get(self.url).headers["ETag"]
+        self.sub.company.cidade = "Fortaleza"
+        self.sub.company.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+
+@pytest.mark.vi
+class PageCacheTestCase(TestCase):
+    def setUp(self):
+        self.sub = baker.make_recipe("core.tests.subscriber_view")
+        self.details = reverse(
+            "details", kwargs={"username": self.sub.username}
+        )
+
+    def assertCached(self, url, params=None):
+        self.client.get(url, params)
+        with self.assertNumQueries(0):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_public_pages_are_cached(self):
+        self.assertCached(reverse("home"))
+        self.assertCached(reverse("about"))
+        self.assertCached(reverse("subs"))
+        self.assertCached(self.details)
+        self.assertCached(
+            reverse("search"),
+            {"location": "n", "category": "t", "search_term": "x"},
+        )
+
+    def test_varies_on_query(self):
+        params = {"location": "n", "category": "t", "search_term": "x"}
+        self.assertCached(reverse("search"), params)
+        response = self.client.get(
+            reverse("search"), {**params, "search_term": "y"}
+        )
+        self.assertIsNotNone(response.context)
+
+    def test_cached_details_answer_conditional_get(self):
+        etag = self.assertCached(self.details).headers["ETag"]
+        response = self.client.get(self.details, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_purge_on_write(self):
+        other = baker.make_recipe("core.tests.subscriber_view")
+        other_details = reverse("details", kwargs={"username": other.username})
+        self.assertCached(self.details)
+        self.assertCached(other_details)
+        self.assertCached(reverse("about"))
+
+        self.sub.company.name = "NOVO NOME"
+        self.sub.company.save()
+
+        response = self.client.get(self.details)
+        self.assertContains(response, "NOVO NOME")
+        with self.assertNumQueries(0):
+            self.client.get(other_details)
+            self.client.get(reverse("about"))
+
+    def test_purge_repeated_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.sub.company.name = "NOVO NOME"
+            self.sub.company.save()
+        # Cached by a reader between the write and the commit
+        self.assertCached(self.details)
+        for callback in callbacks:
+            callback()
+
+        response = self.client.get(self.details)
+        self.assertIsNotNone(response.context)
+
+    def test_purge_on_category2_delete(self):
+        category = baker.make("Category", name="GAMES")
+        Company.objects.filter(pk=self.sub.company.pk).update(
+            categoria2=category
+        )
+        response = self.assertCached(self.details)
+        self.assertContains(response, "GAMES")
+        etag = response.headers["ETag"]
+
+        category.delete()
+
+        response = self.client.get(self.details, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "GAMES")
+
+    def test_purge_old_username(self):
+        self.assertCached(self.details)
+
+        self.sub.username = "renamed"
+        self.sub.save()
+
+        response = self.client.get(self.details)
+        self.assertEqual(response.status_code, 404)
+
+    def test_purge_reaches_other_workers(self):
+        self.assertCached(self.details)
+        # Another worker's purge_pages(), in the shared tier only
+        caches["pages"].shared.set(
+            f"pages:details:{self.sub.username}:generation", "other", None
+        )
+        response = self.client.get(self.details)
+        self.assertIsNotNone(response.context)
+
+    def test_details_key_ignores_case(self):
+        self.assertEqual(
+            page_cache_key(f"details:{self.sub.username}"),
+            page_cache_key(
+                SubscriberDetailView(
+                    kwargs={"username": self.sub.username.upper()}
+                ).get_page_cache_name()
+            ),
+        )
+
+    def test_authenticated_users_bypass_cache(self):
+        self.client.force_login(baker.make("User"))
+        self.client.get(reverse("about"))
+        response = self.client.get(reverse("about"))
+        self.assertIsNotNone(response.context)
+
+
+@pytest.mark.vi
+class ServeMediaTestCase(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+
+        self.hashed = "logos/1/acme-logo.0123456789ab.thumb.jpeg"
+        self.legacy = "1/acme-logo.jpg"
+        for name in (self.hashed, self.legacy):
+            path = os.path.join(self.media_root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(b"jpeg")
+
+    def get(self, name):
+        request = RequestFactory().get(f"/media/{name}")
+        return serve_media(request, name)
+
+    def test_hashed_names_are_immutable(self):
+        response = self.get(self.hashed)
+        self.assertEqual(response.status_code, 200)
+        cache_control = response.headers["Cache-Control"]
+        self.assertIn("immutable", cache_control)
+        self.assertIn("max-age=31536000", cache_control)
+
+    def test_legacy_names_are_not_immutable(self):
+        response = self.get(self.legacy)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Cache-Control", response.headers)
+
+
+@pytest.mark.vi
+class AdminTestCase(TestCase):
+    def setUp(self):
+        self.client.force_login(
+            baker.make("User", is_staff=True, is_superuser=True)
+        )
+
+    def make_rows(self, quantity):
+        for _ in range(quantity):
+            baker.make_recipe("core.tests.subscriber_view")
+            baker.make("Category")
+
+    def changelist_queries(self, model):
+        url = reverse(f"admin:core_{model}_changelist")
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx)
+
+    def test_changelists_query_count_is_constant(self):
+        self.make_rows(2)
+        counts = [
+            self.changelist_queries(model)
+            for model in ("subscriber", "company", "category")
+        ]
+
+        self.make_rows(5)
+        self.assertEqual(
+            [
+                self.changelist_queries(model)
+                for model in ("subscriber", "company", "category")
+            ],
+            counts,
+        )
+
+    def test_foreign_keys_use_autocomplete(self):
+        company = baker.make_recipe("core.tests.company_view", name="acme")
+        category = baker.make("Category", name="padaria")
+
+        response = self.client.get(reverse("admin:core_subscriber_add"))
+        self.assertContains(response, "admin-autocomplete")
+        self.assertNotContains(response, str(company))
+
+        response = self.client.get(reverse("admin:core_company_add"))
+        self.assertContains(response, "admin-autocomplete")
+        self.assertNotContains(response, str(category))
+
+    def test_group_membership_is_cached(self):
+        user = baker.make("User")
+        jedi = baker.make("auth.Group", name="jedi")
+
+        self.assertFalse(in_group(user, "jedi"))
+        with self.assertNumQueries(0):
+            self.assertFalse(in_group(user, "jedi"))
+
+        user.groups.add(jedi)
+        self.assertTrue(in_group(user, "jedi"))
+        user.groups.remove(jedi)
+        self.assertFalse(in_group(user, "jedi"))
+
+    def test_group_removal_reaches_other_workers(self):
+        user = baker.make("User")
+        jedi = baker.make("auth.Group", name="jedi")
+        user.groups.add(jedi)
+        self.assertTrue(in_group(user, "jedi"))
+
+        # Another worker's removal: the row and its shared tier bump only
+        user.groups.through.objects.filter(user=user).delete()
+        caches["default"].shared.set(GROUPS_VERSION_KEY, "other", None)
+        self.assertFalse(in_group(user, "jedi"))
+
+    def test_group_removal_bumped_again_on_commit(self):
+        user = baker.make("User")
+        jedi = baker.make("auth.Group", name="jedi")
+        user.groups.add(jedi)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            user.groups.remove(jedi)
+            # A request cached before the commit: still a member
+            cache = caches["default"].shared
+            cache.set(
+                f"groups:{cache.get(GROUPS_VERSION_KEY)}:{user.pk}:jedi", True
+            )
+        for callback in callbacks:
+            callback()
+        self.assertFalse(in_group(user, "jedi"))
+
+
+@pytest.mark.vi
+class ExportTestCase(TestCase):
+    def setUp(self):
+        category = baker.make("Category", name="padaria")
+        self.subs = [
+            baker.make_recipe(
+                "core.tests.subscriber_view",
+                company__categoria1=category,
+            )
+            for _ in range(3)
+        ]
+        self.subs[2].active = False
+        self.subs[2].save()
+
+    def content(self, response):
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def login(self, *permissions):
+        user = baker.make("User", is_staff=True)
+        for codename in permissions:
+            user.user_permissions.add(
+                Permission.objects.get(codename=codename)
+            )
+        self.client.force_login(user)
+
+    def test_requires_permission(self):
+        url = reverse("export", kwargs={"format": "csv"})
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.login()
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_csv(self):
+        self.login("view_subscriber")
+        response = self.client.get(reverse("export", kwargs={"format": "csv"}))
+
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        rows = list(csv.DictReader(io.StringIO(self.content(response))))
+        self.assertEqual(
+            [row["username"] for row in rows],
+            [sub.username for sub in self.subs[:2]],
+        )
+        self.assertEqual(rows[0]["categoria1"], "PADARIA")
+        self.assertEqual(rows[0]["razao"], self.subs[0].company.razao)
+
+    def test_jsonl(self):
+        self.login("view_subscriber")
+        response = self.client.get(
+            reverse("export", kwargs={"format": "jsonl"})
+        )
+
+        rows = [
+            json.loads(line) for line in self.content(response).splitlines()
+        ]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]["document"], self.subs[0].company.document)
+
+    def test_unknown_format(self):
+        self.login("view_subscriber")
+        response = self.client.get(reverse("export", kwargs={"format": "xls"}))
+        self.assertEqual(response.status_code, 404)
+
+    def test_admin_action(self):
+        self.client.force_login(
+            baker.make("User", is_staff=True, is_superuser=True)
+        )
+        response = self.client.post(
+            reverse("admin:core_subscriber_changelist"),
+            {
+                "action": "export_jsonl",
+                "_selected_action": [self.subs[0].pk, self.subs[2].pk],
+            },
+        )
+
+        rows = [
+            json.loads(line) for line in self.content(response).splitlines()
+        ]
+        self.assertEqual(
+            [row["username"] for row in rows],
+            [self.subs[0].username, self.subs[2].username],
+        )
+
+
+@pytest.mark.vi
+class BulkActionTestCase(TestCase):
+    def setUp(self):
+        self.client.force_login(
+            baker.make("User", is_staff=True, is_superuser=True)
+        )
+        self.subs = [
+            baker.make_recipe("core.tests.subscriber_view") for _ in range(3)
+        ]
+
+    def run_action(self, model, action, pks, **data):
+        return self.client.post(
+            reverse(f"admin:core_{model}_changelist"),
+            {"action": action, "_selected_action": pks, **data},
+            follow=True,
+        )
+
+    def test_deactivate_is_one_update(self):
+        pks = [sub.pk for sub in self.subs[:2]]
+        with CaptureQueriesContext(connection) as ctx:
+            self.run_action("subscriber", "deactivate", pks)
+
+        updates = [q["sql"] for q in ctx if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(
+            list(
+                Subscriber.objects.filter(active=False).values_list(
+                    "pk", flat=True
+                )
+            ),
+            pks,
+        )
+
+    def test_actions_purge_cached_pages(self):
+        sub = self.subs[0]
+        url = reverse("details", kwargs={"username": sub.username})
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.get(reverse("subs"))
+
+        self.run_action("subscriber", "deactivate", [sub.pk])
+
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertNotContains(self.client.get(reverse("subs")), sub.username)
+
+    def test_recategorize(self):
+        category = baker.make("Category", name="padaria")
+        company = self.subs[1].company
+        updated_at = company.updatedAt
+
+        self.run_action(
+            "company", "recategorize", [company.pk], categoria2=category.pk
+        )
+        company.refresh_from_db()
+        self.assertEqual(company.categoria2, category)
+        self.assertGreater(company.updatedAt, updated_at)
+
+        self.run_action(
+            "subscriber",
+            "recategorize",
+            [self.subs[0].pk],
+            categoria1=category.pk,
+        )
+        self.subs[0].company.refresh_from_db()
+        self.assertEqual(self.subs[0].company.categoria1, category)
+
+    def test_recategorize_without_category(self):
+        company = self.subs[0].company
+        response = self.run_action("company", "recategorize", [company.pk])
+        self.assertContains(response, "Escolha ao menos uma categoria.")
+
+
+@pytest.mark.vi
+class TwoTierCacheTestCase(TestCase):
+    def make_cache(self, shared, **options):
+        # A distinct location stands for another worker process
+        return TwoTierCache(
+            uuid.uuid4().hex,
+            {"OPTIONS": {"SHARED": {"LOCATION": shared}, **options}},
+        )
+
+    def test_local_hits(self):
+        cache = self.make_cache(uuid.uuid4().hex)
+        self.assertIsNone(cache.get("other"))
+        cache.set("key", "value")
+        cache.shared.delete("key")
+
+        # Served locally until the next sync
+        self.assertEqual(cache.get("key"), "value")
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_write_invalidates_other_workers(self):
+        shared = uuid.uuid4().hex
+        one = self.make_cache(shared, SYNC_INTERVAL=0)
+        other = self.make_cache(shared, SYNC_INTERVAL=0)
+
+        one.set("key", 1)
+        self.assertEqual(other.get("key"), 1)
+        self.assertEqual(other.stats()["shared_hits"], 1)
+
+        one.set("key", 2)
+        self.assertEqual(other.get("key"), 2)
+        one.delete("key")
+        self.assertIsNone(other.get("key"))
+
+    def test_add_keeps_the_local_entries(self):
+        shared = uuid.uuid4().hex
+        one = self.make_cache(shared, SYNC_INTERVAL=0)
+        other = self.make_cache(shared, SYNC_INTERVAL=0)
+        other.set("key", 1)
+        other.get("key")
+        hits = other.stats()["hits"]
+
+        self.assertTrue(one.add("fill", 1))
+        self.assertFalse(one.add("fill", 2))
+        other.get("key")
+        self.assertEqual(other.stats()["hits"], hits + 1)
+
+    def test_lru_eviction_and_ttl(self):
+        cache = self.make_cache(uuid.uuid4().hex, MAX_ENTRIES=2)
+        for key in ("a", "b", "c"):
+            cache.set(key, key)
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual(cache.stats()["entries"], 2)
+
+        cache = self.make_cache(uuid.uuid4().hex, LOCAL_TIMEOUT=0)
+        cache.set("key", "value")
+        self.assertEqual(cache.get("key"), "value")
+        self.assertEqual(cache.stats()["shared_hits"], 1)
@@ -0,0 +1,43 @@
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+# Maximum upload size in kilobytes of each SubscriberForm image
+UPLOAD_LIMITS = {
+    "logo": 200,
+    "photo1": 500,
+    "photo2": 500,
+    "photo3": 500,
+    "photo4": 500,
+}
+
+
+class SizeLimitUploadHandler(FileUploadHandler):
+    """
+    First of FILE_UPLOAD_HANDLERS: counts the bytes of the limited fields
+    while they stream in and stops reading the request as soon as one
+    goes over the limit, before the next handlers buffer it in memory or
+    on disk. The field is recorded in ``request.upload_errors`` for the
+    form to report, along with the fields parsed before it.
+
+    It's a settings-level handler because CsrfViewMiddleware reads
+    request.POST, and so parses the upload, before any view runs.
+    """
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.limit = UPLOAD_LIMITS.get(field_name)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.limit is not None:
+            self.received += len(raw_data)
+            if self.received > self.limit * 1024:
+                errors = getattr(self.request, "upload_errors", {})
+                errors[self.field_name] = self.limit
+                self.request.upload_errors = errors
+                # SkipFile would still read the rest of the body, the
+                # server drops the connection instead
+                raise StopUpload(connection_reset=True)
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
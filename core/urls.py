@@ -5,12 +5,18 @@ from .views import (
     SubscribersListView,
     SubscriberSearchView,
     AboutView,
+    SubscriberExportView,
 )
 
 urlpatterns = [
     path("", HomeView.as_view(), name="home"),
     path("subs", SubscribersListView.as_view(), name="subs"),
     path("search", SubscriberSearchView.as_view(), name="search"),
+    path(
+        "export/subs.<str:format>",
+        SubscriberExportView.as_view(),
+        name="export",
+    ),
     path(
         "subs/<str:username>", SubscriberDetailView.as_view(), name="details"
     ),
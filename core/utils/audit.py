@@ -0,0 +1,60 @@
+import os
+from core.validators import (
+    digit_errors,
+    document_errors,
+    phone_errors,
+    username_errors,
+)
+
+COMPANY_COLUMNS = ("pk", "document", "is_cpf", "tel1", "tel2")
+SUBSCRIBER_COLUMNS = ("pk", "username", "logo")
+
+
+def column_errors(model, pks, field, errors):
+    return [
+        (model, str(pks[i]), field, message) for i, message in errors.items()
+    ]
+
+
+def audit_companies(rows, check_digits=False):
+    """
+    ``(model, pk, field, message)`` for the rows of ``COMPANY_COLUMNS``
+    breaking the model rules. Runs in worker processes, so it only deals
+    with plain values.
+    """
+    pks, documents, is_cpf, tel1, tel2 = zip(*rows)
+    problems = column_errors("company", pks, "tel1", phone_errors(tel1))
+    # tel2 is optional
+    filled = [i for i, value in enumerate(tel2) if value]
+    problems += column_errors(
+        "company",
+        [pks[i] for i in filled],
+        "tel2",
+        phone_errors([tel2[i] for i in filled]),
+    )
+    # The field rule first, then what Company.clean checks
+    digits = digit_errors(documents)
+    problems += column_errors("company", pks, "document", digits)
+    documents = document_errors(documents, is_cpf, checksum=check_digits)
+    problems += column_errors(
+        "company",
+        pks,
+        "document",
+        {i: m for i, m in documents.items() if i not in digits},
+    )
+    return problems
+
+
+def audit_subscribers(rows, media_root):
+    """Same as ``audit_companies`` for the ``SUBSCRIBER_COLUMNS`` rows."""
+    pks, usernames, logos = zip(*rows)
+    problems = column_errors(
+        "subscriber", pks, "username", username_errors(usernames)
+    )
+    missing = {
+        i: f"Arquivo {logo} não encontrado." if logo else "Sem logo."
+        for i, logo in enumerate(logos)
+        if not logo or not os.path.exists(os.path.join(media_root, logo))
+    }
+    problems += column_errors("subscriber", pks, "logo", missing)
+    return problems
@@ -0,0 +1,46 @@
+import os
+from io import BytesIO
+from PIL import Image, ImageOps
+
+
+def flatten(image):
+    """RGB copy of ``image`` with any transparency laid over white."""
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def reencode_image(path, quality=82, webp=False):
+    """
+    Rewrite ``path`` as a progressive JPEG without metadata when that
+    makes it smaller, optionally with a .webp sibling. Runs in worker
+    processes, so it only deals with paths and returns plain values:
+    ``(path, size before, size after, error)``.
+    """
+    try:
+        before = os.path.getsize(path)
+        with Image.open(path) as image:
+            # EXIF is dropped, apply its rotation to the pixels first
+            image = flatten(ImageOps.exif_transpose(image))
+
+        buffer = BytesIO()
+        image.save(
+            buffer, "JPEG", quality=quality, optimize=True, progressive=True
+        )
+        after = before
+        if buffer.tell() < before:
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(buffer.getvalue())
+            os.replace(tmp_path, path)
+            after = buffer.tell()
+
+        if webp:
+            webp_path = os.path.splitext(path)[0] + ".webp"
+            image.save(webp_path, "WEBP", quality=quality, method=6)
+    except (OSError, ValueError) as e:
+        return path, 0, 0, repr(e)
+    return path, before, after, None
@@ -1,27 +1,93 @@
+import hashlib
 import os
+import unicodedata
 from django.core.files.storage import default_storage
+from django.db import transaction
 from django.utils.text import slugify
+from core.jobs import enqueue_image_job
 
 
-def set_key(instance, key, model):
-    if instance.pk:
-        # Retrieve the existing instance from the database
-        try:
-            existing_instance = model.objects.get(pk=instance.pk)
-        except model.DoesNotExist:
-            return
+BLOB_DIR = "blobs"
 
-        current_field = getattr(existing_instance, key)
 
-        # Delete the previous image file from the storage
-        if current_field and current_field != getattr(instance, key):
-            default_storage.delete(current_field.name)
-    # Generate a unique filename by appending a timestamp
+def set_key(instance, key, previous=None, obsolete=None):
+    """
+    Name the ``key`` file: new uploads after their content (``blob_name``)
+    and other names after the company. When ``previous`` (the row as
+    stored before this save) holds a different file, it's appended to
+    ``obsolete``.
+    """
     instance_field = getattr(instance, key)
-    have_path = bool(os.path.dirname(instance_field.name))
-    if not have_path:
+    if previous is not None and obsolete is not None:
+        current_field = getattr(previous, key)
+        if current_field and current_field != instance_field:
+            obsolete.append(current_field)
+
+    if not instance_field or os.path.dirname(instance_field.name):
+        return
+    digest = content_hash(instance_field)
+    if digest is None:
         slug = slugify(instance.company.razao)
         pk = str(instance.company.pk)
-        pathname = os.path.join(pk, f"{slug}-{key}.jpg")
-        unique_filename = pathname
-        instance_field.name = unique_filename
+        instance_field.name = os.path.join(pk, f"{slug}-{key}.jpg")
+        return
+
+    # Each distinct upload is stored once and shared, see MediaBlob
+    instance_field.name = blob_name(digest)
+    if instance_field.storage.exists(instance_field.name):
+        instance_field._committed = True
+        instance_field.field.set_variations(instance)
+        # The blob may have been stored by a field with other variations
+        enqueue_image_job(instance_field.field, instance_field.name)
+
+
+def content_hash(field_file):
+    """The sha256 of a pending upload, ``None`` when there's no upload."""
+    if field_file._committed:
+        return None
+    digest = hashlib.sha256()
+    for chunk in field_file.file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def blob_name(digest):
+    """Content-addressed storage name: blobs/ab/ab12...ef.jpg"""
+    return f"{BLOB_DIR}/{digest[:2]}/{digest}.jpg"
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(f"{BLOB_DIR}/")
+
+
+def file_names(field_file):
+    """The stored file followed by its stdimage variations."""
+    names = [field_file.name]
+    for variation in getattr(field_file.field, "variations", {}):
+        names.append(field_file.get_variation_name(field_file.name, variation))
+    return names
+
+
+def delete_on_commit(names, storage=default_storage, keep=None):
+    """
+    Delete ``names`` from the storage in a single callback once the
+    transaction commits, so a rolled back save keeps its media. ``keep``
+    returns the names still referenced after the save, which are spared.
+    """
+    if not names:
+        return
+
+    def delete():
+        kept = keep() if keep else ()
+        for name in names:
+            if name not in kept:
+                storage.delete(name)
+
+    transaction.on_commit(delete)
+
+
+def normalize(text):
+    """Lowercase and strip accents: "SÃO JOÃO" -> "sao joao"."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.lower().split())
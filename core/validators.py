@@ -0,0 +1,115 @@
+"""
+Column validators for the directory fields.
+
+Each ``*_errors`` function takes a whole column of values and returns
+``{index: message}`` for the invalid ones, so imports and audits check
+thousands of rows without building model instances. The model fields
+validate their single value through ``validate_one``.
+
+>>> phone_errors(["(85)988887777", "85988887777"])
+{1: 'Formato Inválido. Use (xx)xxxxxxxx ou (xx)9xxxxxxxx.'}
+>>> document_errors(["11144477735", "11144477734"], is_cpf=True)
+{1: 'CPF inválido.'}
+"""
+import re
+from operator import mul
+from django.core.exceptions import ValidationError
+
+USERNAME_RE = re.compile(r"[a-zA-Z]+[a-zA-Z_0-9]*\Z")
+PHONE_RE = re.compile(r"\((?:1[1-9]|9[1-9]|[2-8][0-9])\)(?:9\d{8}|\d{8})\Z")
+DIGITS_RE = re.compile(r"[0-9]+\Z")
+
+USERNAME_FORMAT = (
+    "Username deve iniciar com uma letra. Não deve ter acentuação e pode "
+    "conter números ou underscore _"
+)
+USERNAME_SHORT = "Username muito curto. Mínimo de 6 caracteres"
+USERNAME_MIN_LENGTH = 6
+PHONE_FORMAT = "Formato Inválido. Use (xx)xxxxxxxx ou (xx)9xxxxxxxx."
+DIGITS_ONLY = "Apenas dígitos numéricos."
+# b"0123" -> b"\x00\x01\x02\x03", digits as ints without int() per char
+DIGIT_VALUES = bytes.maketrans(b"0123456789", bytes(range(10)))
+
+# {is_cpf: (length, weights of each check digit, label)}
+DOCUMENTS = {
+    True: (11, (tuple(range(10, 1, -1)), tuple(range(11, 1, -1))), "CPF"),
+    False: (
+        14,
+        (
+            (5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2),
+            (6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2),
+        ),
+        "CNPJ",
+    ),
+}
+
+
+def validate_one(check, value, *args, **kwargs):
+    """Raise the error ``check`` finds in a single ``value``."""
+    errors = check([value], *args, **kwargs)
+    if errors:
+        raise ValidationError(errors[0])
+
+
+def username_errors(values):
+    errors = {}
+    for i, value in enumerate(values):
+        if not USERNAME_RE.match(value):
+            errors[i] = USERNAME_FORMAT
+        elif len(value) < USERNAME_MIN_LENGTH:
+            errors[i] = USERNAME_SHORT
+    return errors
+
+
+def phone_errors(values):
+    return {
+        i: PHONE_FORMAT
+        for i, value in enumerate(values)
+        if not PHONE_RE.match(value)
+    }
+
+
+def digit_errors(values):
+    return {
+        i: DIGITS_ONLY
+        for i, value in enumerate(values)
+        if not DIGITS_RE.match(value)
+    }
+
+
+def check_digits(digits, weights):
+    """
+    Whether the trailing digits of ``digits`` are the mod 11 check digits
+    of the ones before them.
+    """
+    for position, factors in enumerate(weights, start=len(weights[0])):
+        remainder = sum(map(mul, digits, factors)) % 11
+        if digits[position] != (0 if remainder < 2 else 11 - remainder):
+            return False
+    # Repeated digits pass the arithmetic but are never issued
+    return digits.count(digits[0]) != len(digits)
+
+
+def document_errors(values, is_cpf, checksum=True):
+    """
+    Check CPF (``is_cpf``) or CNPJ lengths and, with ``checksum``, digits
+    and check digits. ``is_cpf`` is one flag for every value or a column
+    of flags.
+    """
+    if isinstance(is_cpf, bool):
+        is_cpf = [is_cpf] * len(values)
+
+    errors = {}
+    for i, (value, cpf) in enumerate(zip(values, is_cpf)):
+        length, weights, label = DOCUMENTS[bool(cpf)]
+        if len(value) != length:
+            errors[i] = f"{label} precisa de {length} dígitos"
+        elif not checksum:
+            continue
+        elif not DIGITS_RE.match(value):
+            errors[i] = DIGITS_ONLY
+        else:
+            digits = value.encode().translate(DIGIT_VALUES)
+            if not check_digits(digits, weights):
+                errors[i] = f"{label} inválido."
+    return errors
@@ -1,21 +1,262 @@
+import base64
+import binascii
 import datetime
+import json
+import re
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.contrib.auth.mixins import PermissionRequiredMixin
+from django.views import View
 from django.views.generic.detail import DetailView
 from django.views.generic import ListView, TemplateView
 from django.shortcuts import get_object_or_404
 from django.db.models import Q
-from .models import Subscriber, Category, ESTADO_CHOICES
+from django.http import Http404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.views.static import serve
+from .models import Subscriber, ESTADO_CHOICES
+from .search.backends import get_backend
+from .cache import (
+    search_cache_key,
+    get_search_page,
+    set_search_page,
+    get_categories,
+    page_cache_key,
+    get_page,
+    set_page,
+)
+from .export import FORMATS, export_response
+from .utils.index import normalize
 
 
-class TableView(ListView):
+# KEYSET PAGINATION
+def encode_cursor(ordering, values, backwards=False):
+    payload = {"o": ordering, "v": values, "b": backwards}
+    raw = json.dumps(payload, cls=DjangoJSONEncoder, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    padding = "=" * (-len(cursor) % 4)
+    try:
+        raw = base64.urlsafe_b64decode(cursor + padding)
+        payload = json.loads(raw)
+        return payload["o"], payload["v"], bool(payload["b"])
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise Http404("Cursor inválido.")
+
+
+def flip(field):
+    return field[1:] if field.startswith("-") else "-" + field
+
+
+def keyset_filter(ordering, values, backwards=False):
+    """
+    Build the seek predicate ``(a, b) > (x, y)`` as
+    ``a > x OR (a = x AND b > y)``, honouring each field direction.
+    """
+    condition = Q()
+    equals = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+        descending = field.startswith("-") != backwards
+        lookup = f"{name}__lt" if descending else f"{name}__gt"
+        condition |= equals & Q(**{lookup: value})
+        equals &= Q(**{name: value})
+    return condition
+
+
+def resolve_value(obj, field):
+    value = obj
+    for attr in field.lstrip("-").split("__"):
+        value = getattr(value, attr)
+    return value
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, previous_cursor, last_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.last_cursor = last_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginationMixin:
+    """
+    Seek pagination: every page is ``WHERE key > cursor ORDER BY key
+    LIMIT n`` so page 5.000 costs the same as page 1. Non-unique orderings
+    get a tiebreaker: ``company_id`` after company columns (tel1...), so a
+    ``(column, id)`` index on core_company serves them, the pk otherwise.
+    """
+
+    cursor_kwarg = "cursor"
+
+    def get_keyset_ordering(self):
+        ordering = self.get_ordering()
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        ordering = list(ordering)
+        last = ordering[-1]
+        if not self.is_unique(last):
+            name = last.lstrip("-")
+            # company_id is unique through the OneToOne
+            tiebreak = "company_id" if name.startswith("company__") else "pk"
+            ordering.append(last[: len(last) - len(name)] + tiebreak)
+        return ordering
+
+    def is_unique(self, field):
+        *relations, name = field.lstrip("-").split("__")
+        model = self.model
+        for relation in relations:
+            model = model._meta.get_field(relation).related_model
+        if name == "pk":
+            return True
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # An annotation, like the search rank
+            return False
+        return field.primary_key or field.unique
+
+    def get_keyset_page(self, queryset, page_size):
+        ordering = self.get_keyset_ordering()
+        values, backwards = None, False
+        cursor = self.request.GET.get(self.cursor_kwarg)
+        if cursor:
+            cursor_ordering, values, backwards = decode_cursor(cursor)
+            if cursor_ordering != ordering:
+                # The daily ordering rotated, restart from the first page
+                values, backwards = None, False
+
+        if values is not None:
+            if not isinstance(values, list) or len(values) != len(ordering):
+                raise Http404("Cursor inválido.")
+            queryset = queryset.filter(
+                keyset_filter(ordering, values, backwards)
+            )
+
+        if backwards:
+            queryset = queryset.order_by(*[flip(f) for f in ordering])
+        else:
+            queryset = queryset.order_by(*ordering)
+
+        rows = list(queryset[: page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        seeking = values is not None and bool(rows)
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = seeking, has_more
+        else:
+            has_next, has_previous = has_more, seeking
+
+        def cursor_for(obj, backwards):
+            values = [resolve_value(obj, f) for f in ordering]
+            return encode_cursor(ordering, values, backwards)
+
+        return KeysetPage(
+            rows,
+            cursor_for(rows[-1], False) if has_next else None,
+            cursor_for(rows[0], True) if has_previous else None,
+            encode_cursor(ordering, None, True) if has_next else None,
+        )
+
+    def paginate_queryset(self, queryset, page_size):
+        page = self.get_keyset_page(queryset, page_size)
+        return None, page, page.object_list, page.has_other_pages()
+
+
+# FULL-PAGE CACHE
+class PageCacheMixin:
+    """
+    Serve anonymous GETs from the "pages" cache. The key is the page name
+    (the purge group, see ``purge_pages``) plus ``get_page_cache_vary()``,
+    the request values the HTML depends on.
+    """
+
+    page_cache_name = None
+    page_cache_params = ()
+
+    def get_page_cache_name(self):
+        return self.page_cache_name
+
+    def get_page_cache_vary(self):
+        return [self.request.GET.get(p) for p in self.page_cache_params]
+
+    def dispatch(self, request, *args, **kwargs):
+        if (
+            request.method not in ("GET", "HEAD")
+            or request.user.is_authenticated
+        ):
+            return super().dispatch(request, *args, **kwargs)
+
+        key = page_cache_key(
+            self.get_page_cache_name(), *self.get_page_cache_vary()
+        )
+        cached = get_page(key)
+        if cached is not None:
+            return get_conditional_response(
+                request,
+                etag=cached.get("ETag"),
+                last_modified=parse_http_date_safe(
+                    cached.get("Last-Modified")
+                ),
+                response=cached,
+            )
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200 and not response.cookies:
+            if getattr(response, "is_rendered", True):
+                set_page(key, response)
+            else:
+                response.add_post_render_callback(lambda r: set_page(key, r))
+        return response
+
+
+class TableView(PageCacheMixin, KeysetPaginationMixin, ListView):
+    def get_page_cache_vary(self):
+        # The daily ordering rotation changes the page too
+        vary = super().get_page_cache_vary()
+        return vary + [self.get_keyset_ordering()]
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        version, categories = get_categories()
+        context["estados"] = ESTADO_CHOICES
+        context["categories"] = categories
+        context["categories_version"] = version
+        return context
+
     def get_ordering(self):
         current_date = datetime.datetime.now()
         day_of_week = current_date.weekday()
+        # company_id rather than company__id, sorted without the join
         choices = [
-            "company__id",
+            "company_id",
             "-id",
             "company__tel1",
             "company__document",
-            "-company__id",
+            "-company_id",
             "-company__tel1",
             "-company__document",
         ]
@@ -23,8 +264,9 @@ class TableView(ListView):
         return choices[day_of_week]
 
 
-class HomeView(TemplateView):
+class HomeView(PageCacheMixin, TemplateView):
     template_name = "pages/index.html"
+    page_cache_name = "home"
 
 
 class SubscribersListView(TableView):
@@ -32,69 +274,70 @@ class SubscribersListView(TableView):
     template_name = "pages/list.html"
     context_object_name = "subs"
     paginate_by = 10
+    page_cache_name = "subs"
+    page_cache_params = ("cursor",)
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().for_listing()
         actives = queryset.filter(active=True)
         return actives
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context["estados"] = ESTADO_CHOICES
-        context["categories"] = Category.objects.all()
-
-        return context
-
 
 class SubscriberSearchView(TableView):
     model = Subscriber
     template_name = "pages/search.html"
     context_object_name = "subs"
     paginate_by = 10
-    ordering = "company__name"
+    page_cache_name = "search"
+    page_cache_params = ("search_term", "location", "category", "cursor")
+
+    def get_search_term(self):
+        search_term = self.request.GET.get("search_term")
+        return search_term.strip() if bool(search_term) else ""
+
+    def get_ordering(self):
+        if self.get_search_term():
+            return ["-rank", "company__name"]
+        return super().get_ordering()
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        # Ordering is applied by the paginator once ``rank`` is annotated
+        queryset = self.model._default_manager.for_listing()
         actives = queryset.filter(active=True)
-        search_term = self.request.GET.get("search_term")
         ctg_pk = self.request.GET.get("category")
-        q = search_term if bool(search_term) else ""
+        q = self.get_search_term()
         uf = self.request.GET.get("location")
 
-        if uf == "n":
-            if ctg_pk == "t":
-                qs = actives.filter(Q(company__name__icontains=q))
-                return qs
-            qs = actives.filter(
-                Q(
-                    Q(company__name__icontains=q)
-                    & Q(company__categoria1=ctg_pk)
-                )
-                | Q(
-                    Q(company__name__icontains=q)
-                    & Q(company__categoria2=ctg_pk)
-                )
+        if uf != "n":
+            actives = actives.filter(company__uf=uf)
+        if ctg_pk != "t":
+            actives = actives.filter(
+                Q(company__categoria1=ctg_pk) | Q(company__categoria2=ctg_pk)
             )
-            return qs
+        if q:
+            actives = get_backend().search(actives, q)
+        return actives
+
+    def paginate_queryset(self, queryset, page_size):
+        key = search_cache_key(
+            normalize(self.get_search_term()),
+            self.request.GET.get("location"),
+            self.request.GET.get("category"),
+            self.request.GET.get(self.cursor_kwarg) or "",
+            self.get_keyset_ordering(),
+            page_size,
+        )
+        cached = get_search_page(key)
+        if cached is None:
+            page = self.get_keyset_page(queryset, page_size)
+            cursors = (page.next_cursor, page.previous_cursor)
+            cursors += (page.last_cursor,)
+            set_search_page(key, [sub.pk for sub in page], cursors)
         else:
-            if ctg_pk == "t":
-                qs = actives.filter(
-                    Q(company__name__icontains=q) & Q(company__uf=uf)
-                )
-                return qs
-            qs = actives.filter(
-                Q(
-                    Q(company__name__icontains=q)
-                    & Q(company__categoria1=ctg_pk)
-                    & Q(company__uf=uf)
-                )
-                | Q(
-                    Q(company__name__icontains=q)
-                    & Q(company__categoria2=ctg_pk)
-                    & Q(company__uf=uf)
-                )
-            )
-            return qs
+            ids, cursors = cached
+            rows = self.model._default_manager.for_listing().in_bulk(ids)
+            page = KeysetPage([rows[pk] for pk in ids if pk in rows], *cursors)
+        return None, page, page.object_list, page.has_other_pages()
 
     def get_context_data(self, **kwargs):
         search_term = self.request.GET.get("search_term")
@@ -105,25 +348,88 @@ class SubscriberSearchView(TableView):
         context["l"] = uf
         context["s"] = q
         context["c"] = c
-        context["estados"] = ESTADO_CHOICES
-        context["categories"] = Category.objects.all()
         return context
 
 
-class SubscriberDetailView(DetailView):
+class SubscriberDetailView(PageCacheMixin, DetailView):
     model = Subscriber
     template_name = "pages/details.html"
+    context_object_name = "sub"
+
+    def get_page_cache_name(self):
+        # Stored usernames are lowercase, the URL may not be (MySQL matches
+        # it case-insensitively) and the save path purges the stored one
+        return f"details:{self.kwargs.get('username', '').lower()}"
+
+    def get_queryset(self):
+        return Subscriber.objects.select_related(
+            "company", "company__categoria1", "company__categoria2"
+        ).filter(active=True)
 
     def get_object(self, queryset=None):
         username = self.kwargs.get("username")
+        if queryset is None:
+            queryset = self.get_queryset()
 
-        return get_object_or_404(Subscriber, username=username, active=True)
+        return get_object_or_404(queryset, username=username)
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context["sub"] = self.get_object()
-        return context
+    def get_last_modified(self):
+        company = self.object.company
+        rows = [self.object, company, company.categoria1, company.categoria2]
+        return max(row.updatedAt for row in rows if row is not None)
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        last_modified = self.get_last_modified()
+        etag = quote_etag(f"{self.object.pk}-{last_modified.timestamp():.6f}")
+        timestamp = int(last_modified.timestamp())
 
+        # 304 before anything is rendered
+        response = get_conditional_response(
+            request, etag=etag, last_modified=timestamp
+        )
+        if response is None:
+            context = self.get_context_data(object=self.object)
+            response = self.render_to_response(context)
 
-class AboutView(TemplateView):
+        response.headers["ETag"] = etag
+        response.headers["Last-Modified"] = http_date(timestamp)
+        patch_cache_control(response, no_cache=True)
+        return response
+
+
+class AboutView(PageCacheMixin, TemplateView):
     template_name = "pages/about.html"
+    page_cache_name = "about"
+
+
+class SubscriberExportView(PermissionRequiredMixin, View):
+    """Active subscribers as CSV or JSONL, for partners syncing nightly."""
+
+    permission_required = "core.view_subscriber"
+    raise_exception = True
+
+    def get(self, request, format):
+        if format not in FORMATS:
+            raise Http404("Formato inválido.")
+        queryset = Subscriber.objects.filter(active=True)
+        return export_response(queryset, format)
+
+
+# MEDIA
+HASHED_NAME = re.compile(r"[./][0-9a-f]{12,64}\.")
+MEDIA_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def serve_media(request, path):
+    """
+    ``django.views.static.serve`` for MEDIA_ROOT. Uploads are named after
+    their content hash (core/utils/index.py), so a hashed name never
+    changes and may be cached for a year.
+    """
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    if HASHED_NAME.search(path):
+        patch_cache_control(
+            response, public=True, max_age=MEDIA_MAX_AGE, immutable=True
+        )
+    return response
@@ -0,0 +1,4 @@
+const linkText = 'Desenvolvido com ❤️ por Alan Tanaka';
+const linkStyle = 'color: blue; font-weight: 900;';
+console.log(`%c${linkText}`, linkStyle);
+console.log('https://t.me/alantnk');